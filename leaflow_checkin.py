@@ -4,24 +4,73 @@ import sys
 import time
 import logging
 import html
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
-import requests
-from datetime import datetime
-
-# 在GitHub Actions或Docker环境中使用webdriver-manager
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service
+import base64
+import asyncio
+import queue
+import threading
+import json
+import multiprocessing
+import hashlib
+import functools
+import random
+import signal
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import shutil
+import subprocess
+from urllib.parse import urljoin, urlparse
+from datetime import datetime, timedelta, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 # 配置日志
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Selenium 与 requests 延迟导入：配置检查、台账跳过等不需要浏览器的路径不加载它们
+webdriver = By = WebDriverWait = EC = Options = ActionChains = Service = None
+TimeoutException = NoSuchElementException = WebDriverException = None
+requests = HTTPAdapter = None
+_IMPORT_LOCK = threading.Lock()
+
+def _load_selenium():
+    """首次需要浏览器时导入 Selenium（每个进程只导入一次）"""
+    global webdriver, By, WebDriverWait, EC, Options, ActionChains, Service
+    global TimeoutException, NoSuchElementException, WebDriverException
+    if webdriver is not None:
+        return
+    with _IMPORT_LOCK:
+        if webdriver is not None:
+            return
+        start = time.perf_counter()
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.common.action_chains import ActionChains
+        from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
+        from selenium import webdriver as _webdriver
+        webdriver = _webdriver
+        RUN_REPORT.record('import_selenium', time.perf_counter() - start)
+
+def _load_requests():
+    """首次发起 HTTP 请求时导入 requests"""
+    global requests, HTTPAdapter
+    if requests is not None:
+        return
+    with _IMPORT_LOCK:
+        if requests is not None:
+            return
+        start = time.perf_counter()
+        from requests.adapters import HTTPAdapter
+        import requests as _requests
+        requests = _requests
+        RUN_REPORT.record('import_requests', time.perf_counter() - start)
+
 def _ensure_utf8_output():
     try:
         if sys.platform == 'win32':
@@ -38,8 +87,2353 @@ def _ensure_utf8_output():
 
 _ensure_utf8_output()
 
+# 主站地址，可通过 LEAFLOW_BASE_URL 指向本地模拟站点（基准测试用）
+BASE_URL = os.getenv('LEAFLOW_BASE_URL', '').strip().rstrip('/') or "https://leaflow.net"
+DEFAULT_CHECKIN_URL = "https://checkin.leaflow.net"
+
+def _env_int(name, default, minimum=None):
+    """读取整数型环境变量，非法值回退到默认值"""
+    raw = os.getenv(name, '').strip()
+    value = default
+    if raw:
+        try:
+            value = int(raw)
+        except ValueError:
+            logger.warning(f"环境变量 {name}={raw} 不是有效整数，使用默认值 {default}")
+    if minimum is not None and value < minimum:
+        value = minimum
+    return value
+
+def _env_float(name, default, minimum=None):
+    """读取浮点型环境变量，非法值回退到默认值"""
+    raw = os.getenv(name, '').strip()
+    value = default
+    if raw:
+        try:
+            value = float(raw)
+        except ValueError:
+            logger.warning(f"环境变量 {name}={raw} 不是有效数字，使用默认值 {default}")
+    if minimum is not None and value < minimum:
+        value = minimum
+    return value
+
+def _env_bool(name, default=False):
+    """读取布尔型环境变量（1/true/yes/on 视为开启）"""
+    raw = os.getenv(name, '').strip().lower()
+    if not raw:
+        return default
+    return raw in ('1', 'true', 'yes', 'on')
+
+def _mask_email(email):
+    at = email.find("@")
+    return email[:3] + "***" + (email[at:] if at >= 0 else "")
+
+def _account_key(email):
+    """账号在状态文件中的键：邮箱哈希，不在本地文件中保存明文邮箱"""
+    return hashlib.sha256(email.strip().lower().encode('utf-8')).hexdigest()[:32]
+
+def _state_path(name):
+    """本地状态文件路径（会话缓存等），目录由 LEAFLOW_STATE_DIR 指定"""
+    return os.path.join(os.getenv('LEAFLOW_STATE_DIR', '.leaflow_state'), name)
+
+class JsonStateFile:
+    """JSON 状态文件：读改写时加线程锁和文件锁，写入采用临时文件替换保证原子性"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"读取状态文件 {self.path} 失败，将重新创建: {e}")
+            return {}
+
+    def _write(self, data):
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        try:
+            os.chmod(tmp_path, 0o600)
+        except Exception:
+            pass
+        os.replace(tmp_path, self.path)
+
+    def update(self, func):
+        """在锁内执行 func(data)，随后写回；返回 func 的返回值"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            lock_file = open(f"{self.path}.lock", 'a')
+            try:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                data = self.load()
+                result = func(data)
+                self._write(data)
+                return result
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+class SessionStore:
+    """按账号持久化登录 Cookie，下次运行时直接恢复会话以跳过表单登录"""
+
+    COOKIE_FIELDS = ('name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry', 'sameSite')
+
+    def __init__(self, path=None, ttl_hours=None):
+        self.file = JsonStateFile(path or _state_path('sessions.json'))
+        if ttl_hours is None:
+            ttl_hours = _env_int('LEAFLOW_SESSION_TTL_HOURS', 72, minimum=1)
+        self.ttl_seconds = ttl_hours * 3600
+
+    def load(self, email):
+        """返回未过期的 Cookie 列表，没有可用会话时返回 None"""
+        entry = self.file.load().get(_account_key(email))
+        if not entry:
+            return None
+        now = time.time()
+        if now - entry.get('saved_at', 0) > self.ttl_seconds:
+            logger.info("本地会话缓存已过期")
+            self.invalidate(email)
+            return None
+        cookies = [c for c in entry.get('cookies', []) if not c.get('expiry') or c['expiry'] > now]
+        return cookies or None
+
+    def save(self, email, cookies):
+        cookies = [{k: c[k] for k in self.COOKIE_FIELDS if k in c} for c in cookies or [] if c.get('name')]
+        if not cookies:
+            return
+
+        def _save(data):
+            data[_account_key(email)] = {'saved_at': time.time(), 'cookies': cookies}
+        self.file.update(_save)
+
+    def invalidate(self, email):
+        self.file.update(lambda data: data.pop(_account_key(email), None))
+
+REWARD_TEXT_PATTERN = re.compile(r'获得了?\s*(\d+\.?\d*)\s*元')
+
+def _parse_reward(text):
+    match = REWARD_TEXT_PATTERN.search(str(text or ''))
+    return float(match.group(1)) if match else None
+
+UNCONFIRMED_RESULT_PATTERN = re.compile(r'失败|错误|出错|未检测到明确结果')
+
+def _is_confirmed_result(success, result):
+    """签到已确认完成（成功或今日已签到）；流程未报错但结果为签到失败/无法确认的不算"""
+    return bool(success) and not UNCONFIRMED_RESULT_PATTERN.search(str(result or ''))
+
+class CheckinLedger:
+    """本地签到台账（追加写入的 JSONL）：记录每个账号每天的成功签到、奖励和余额
+
+    签到按北京时间（可用 LEAFLOW_LEDGER_UTC_OFFSET 调整）的自然日计算，
+    重新运行时当天已完成的账号直接跳过浏览器流程。
+    写入时若最早的记录已超出保留天数（LEAFLOW_LEDGER_DAYS），整理文件只保留最近的记录。
+    """
+
+    def __init__(self, path=None, utc_offset_hours=None, keep_days=None):
+        self.path = path or _state_path('ledger.jsonl')
+        if utc_offset_hours is None:
+            utc_offset_hours = _env_int('LEAFLOW_LEDGER_UTC_OFFSET', 8)
+        self.tz = timezone(timedelta(hours=utc_offset_hours))
+        self.keep_days = keep_days if keep_days is not None else _env_int('LEAFLOW_LEDGER_DAYS', 90, minimum=1)
+        self._lock = threading.Lock()
+
+    def today(self):
+        return datetime.now(self.tz).strftime('%Y-%m-%d')
+
+    def entries_for(self, day=None):
+        """返回指定日期每个账号最后一条记录，键为账号哈希"""
+        day = day or self.today()
+        entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('date') == day:
+                        entries[entry.get('account')] = entry
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"读取签到台账失败: {e}")
+        return entries
+
+    def record(self, email, result, balance):
+        entry = {
+            'date': self.today(),
+            'time': datetime.now(self.tz).strftime('%H:%M:%S'),
+            'account': _account_key(email),
+            'label': _account_label(email),
+            'result': str(result),
+            'reward': _parse_reward(result),
+            'balance': str(balance),
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            # 锁放在单独的文件上，整理时替换台账文件不会让其它进程写到旧文件里
+            lock_file = open(f"{self.path}.lock", 'a')
+            try:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                self._compact()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+        return entry
+
+    def _compact(self):
+        """最早一条记录超出保留天数时重写台账，只保留最近 keep_days 天（调用方持有锁）"""
+        cutoff = (datetime.now(self.tz) - timedelta(days=self.keep_days)).strftime('%Y-%m-%d')
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                try:
+                    first = json.loads(f.readline()).get('date', '')
+                except ValueError:
+                    first = ''
+                if first >= cutoff:
+                    return
+                f.seek(0)
+                kept = []
+                for line in f:
+                    try:
+                        if json.loads(line).get('date', '') >= cutoff:
+                            kept.append(line)
+                    except ValueError:
+                        continue
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(kept)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.warning(f"整理签到台账失败: {e}")
+
+    @staticmethod
+    def describe(entry):
+        """通知中展示的台账记录"""
+        message = f"今日已签到（本地记录，{entry.get('time', '')} 完成"
+        if entry.get('reward'):
+            message += f"，获得 {entry['reward']:g} 元"
+        return message + "）"
+
+class RunCheckpoint:
+    """运行检查点：每个账号完成后立即落盘，进程中断后可用 LEAFLOW_RESUME 继续
+
+    检查点与账号列表绑定（账号哈希指纹），账号配置变化或上次运行已正常结束时重新开始。
+    """
+
+    def __init__(self, path=None):
+        self.file = JsonStateFile(path or _state_path('checkpoint.json'))
+
+    @staticmethod
+    def fingerprint(accounts):
+        keys = sorted(_account_key(account['email']) for account in accounts)
+        return hashlib.sha256(','.join(keys).encode('utf-8')).hexdigest()[:32]
+
+    def start(self, accounts, resume=False):
+        """开始一次运行；可恢复时返回上次已记录的结果（键为账号哈希）"""
+        fingerprint = self.fingerprint(accounts)
+        previous = self.file.load()
+        if resume and previous.get('fingerprint') == fingerprint and not previous.get('completed'):
+            results = previous.get('results') or {}
+            logger.info(f"从检查点恢复（{previous.get('started_at')} 开始的运行），已记录 {len(results)} 个账号的结果")
+            return results
+        if resume:
+            logger.info("没有可恢复的检查点，重新开始")
+
+        def _reset(data):
+            data.clear()
+            data.update({
+                'fingerprint': fingerprint,
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+                'completed': False,
+                'results': {},
+            })
+        self.file.update(_reset)
+        return {}
+
+    def record(self, email, success, result, balance):
+        def _record(data):
+            data.setdefault('results', {})[_account_key(email)] = {
+                'success': success,
+                'result': str(result),
+                'balance': str(balance),
+                'finished_at': datetime.now().isoformat(timespec='seconds'),
+            }
+        self.file.update(_record)
+
+    def results(self):
+        return self.file.load().get('results') or {}
+
+    def complete(self):
+        self.file.update(lambda data: data.update({'completed': True}))
+
+class StrategyStore:
+    """按账号记录各签到路径（方案 / iframe 或主文档 / 选择器）的成败次数
+
+    下次运行时按平滑成功率 (成功+1)/(总数+2) 排序，持续失败的路径自动靠后；
+    以 LEAFLOW_STRATEGY_EPSILON 的概率沿用默认顺序，让被降级的路径有机会重新验证。
+    """
+
+    # 只保留最近约 20 次的权重，曾经可靠但已失效的路径能较快降级
+    HISTORY = 20
+
+    def __init__(self, path=None, epsilon=None):
+        self.file = JsonStateFile(path or _state_path('strategies.json'))
+        if epsilon is None:
+            epsilon = _env_float('LEAFLOW_STRATEGY_EPSILON', 0.1, minimum=0)
+        self.epsilon = min(1.0, epsilon)
+
+    def load(self, email):
+        entry = self.file.load().get(_account_key(email))
+        return entry if isinstance(entry, dict) else {}
+
+    def explore(self):
+        return random.random() < self.epsilon
+
+    @staticmethod
+    def score(stats):
+        ok, fail = stats.get('ok', 0), stats.get('fail', 0)
+        return (ok + 1) / (ok + fail + 2)
+
+    @classmethod
+    def order(cls, entry, category, defaults):
+        """按历史成功率排序，分数相同保持默认顺序"""
+        stats = (entry or {}).get(category) or {}
+        ranked = sorted(enumerate(defaults), key=lambda item: (-cls.score(stats.get(item[1], {})), item[0]))
+        return [path for _, path in ranked]
+
+    def record(self, email, outcomes):
+        """outcomes: {category: {path: 是否成功}}，返回更新后的账号记录"""
+        def _record(data):
+            entry = data.setdefault(_account_key(email), {})
+            for category, paths in outcomes.items():
+                stats = entry.setdefault(category, {})
+                for path, ok in paths.items():
+                    item = stats.setdefault(path, {'ok': 0, 'fail': 0})
+                    item['ok' if ok else 'fail'] += 1
+                    total = item['ok'] + item['fail']
+                    if total > self.HISTORY:
+                        item['ok'] = round(item['ok'] * self.HISTORY / total, 2)
+                        item['fail'] = round(item['fail'] * self.HISTORY / total, 2)
+                    item['last'] = 'ok' if ok else 'fail'
+            entry['updated_at'] = datetime.now().isoformat(timespec='seconds')
+            return dict(entry)
+        return self.file.update(_record)
+
+class LocatorCache:
+    """页面元素定位缓存：按页面角色（登录邮箱框、登录按钮、余额、签到按钮等）记住上次命中的选择器
+
+    缓存写入状态目录的 locators.json，所有账号共享；下次先用短超时尝试缓存的选择器，
+    未命中时再遍历完整列表。命中率写入运行报告。
+    """
+
+    def __init__(self, path=None):
+        self.file = JsonStateFile(path or _state_path('locators.json'))
+        self.enabled = _env_bool('LEAFLOW_LOCATOR_CACHE', True)
+        self.fast_timeout = _env_float('LEAFLOW_LOCATOR_TIMEOUT', 2, minimum=0.1)
+        self._lock = threading.Lock()
+        self._selectors = None
+        self.stats = {}
+
+    def get(self, role, selectors):
+        """返回该角色缓存的选择器（不在当前候选列表中时视为无缓存）"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            selector = self._cached().get(role)
+        return selector if selector in selectors else None
+
+    def _cached(self):
+        if self._selectors is None:
+            self._selectors = {role: entry.get('selector') for role, entry in self.file.load().items()
+                               if isinstance(entry, dict)}
+        return self._selectors
+
+    def order(self, role, selectors):
+        """把缓存的选择器排到最前，其余保持原顺序"""
+        cached = self.get(role, selectors)
+        if not cached:
+            return list(selectors)
+        return [cached] + [s for s in selectors if s != cached]
+
+    def record(self, role, selector, cached=None, hit=None):
+        """记录一次查找：命中缓存计为 hits，有缓存但未命中计为 misses，无缓存计为 cold；随后更新缓存"""
+        if not self.enabled:
+            return
+        if hit is None:
+            hit = bool(cached) and selector == cached
+        key = 'hits' if hit else ('misses' if cached else 'cold')
+        with self._lock:
+            stats = self.stats.setdefault(role, {'hits': 0, 'misses': 0, 'cold': 0})
+            stats[key] += 1
+            if not selector or selector == cached:
+                return
+            self._cached()[role] = selector
+
+        def _store(data):
+            data[role] = {'selector': selector, 'updated_at': datetime.now().isoformat(timespec='seconds')}
+        try:
+            self.file.update(_store)
+        except Exception as e:
+            logger.warning(f"写入定位缓存失败: {e}")
+
+    def merge(self, summary):
+        """合并子进程的命中统计"""
+        with self._lock:
+            for role, counts in (summary or {}).items():
+                stats = self.stats.setdefault(role, {'hits': 0, 'misses': 0, 'cold': 0})
+                for key in stats:
+                    stats[key] += counts.get(key, 0)
+
+    def summary(self):
+        with self._lock:
+            summary = {}
+            for role, stats in self.stats.items():
+                total = sum(stats.values())
+                summary[role] = dict(stats, hit_rate=round(stats['hits'] / total, 3) if total else None)
+            return summary
+
+LOCATORS = LocatorCache()
+
+def _locator_by(selector):
+    return By.XPATH if selector.startswith(("//", "(")) else By.CSS_SELECTOR
+
+DOM_SNAPSHOT_SCRIPT = """
+const selectors = arguments[0] || [];
+const perSelectorLimit = arguments[1] || 100;
+const textLimit = arguments[2] || 300;
+const includeBody = !!arguments[3];
+const items = [];
+const index = new Map();
+function isVisible(el) {
+  if (!el.getBoundingClientRect) return false;
+  const rect = el.getBoundingClientRect();
+  if (rect.width === 0 || rect.height === 0) return false;
+  const style = window.getComputedStyle(el);
+  return !!style && style.display !== 'none' && style.visibility !== 'hidden' && style.opacity !== '0';
+}
+function ownText(el) {
+  let text = '';
+  for (const node of el.childNodes) {
+    if (node.nodeType === 3) text += node.nodeValue;
+  }
+  return text.trim();
+}
+function add(el) {
+  if (index.has(el)) return index.get(el);
+  const cls = typeof el.className === 'string' ? el.className : (el.getAttribute('class') || '');
+  items.push({
+    el: el,
+    tag: (el.tagName || '').toLowerCase(),
+    text: (el.innerText || el.textContent || '').trim().slice(0, textLimit),
+    own: ownText(el).slice(0, textLimit),
+    role: el.getAttribute('role') || '',
+    cls: cls,
+    visible: isVisible(el),
+    enabled: !(el.disabled === true)
+  });
+  index.set(el, items.length - 1);
+  return items.length - 1;
+}
+function query(sel) {
+  const out = [];
+  try {
+    if (sel.startsWith('/') || sel.startsWith('(')) {
+      const result = document.evaluate(sel, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+      for (let i = 0; i < result.snapshotLength && out.length < perSelectorLimit; i++) {
+        const node = result.snapshotItem(i);
+        if (node && node.nodeType === 1) out.push(node);
+      }
+    } else {
+      for (const node of document.querySelectorAll(sel)) {
+        if (out.length >= perSelectorLimit) break;
+        out.push(node);
+      }
+    }
+  } catch (e) {}
+  return out;
+}
+const matches = {};
+for (const sel of selectors) matches[sel] = query(sel).map(add);
+return {
+  items: items,
+  matches: matches,
+  url: location.href,
+  iframes: document.getElementsByTagName('iframe').length,
+  bodyText: includeBody && document.body ? document.body.innerText : ''
+};
+"""
+
+# 点击前打下时间标记，之后新增的节点连同时间戳记录下来；
+# 结果等待只看标记之后出现的节点，页面上原有的文本不会被误判为结果
+MARK_CHANGES_SCRIPT = """
+window.__leaflowChangeMark = performance.now();
+window.__leaflowAdded = [];
+if (!window.__leaflowAddObserver) {
+  window.__leaflowAddObserver = new MutationObserver(records => {
+    const t = performance.now();
+    const added = window.__leaflowAdded || (window.__leaflowAdded = []);
+    for (const r of records) {
+      const nodes = r.type === 'childList' ? r.addedNodes : [r.target];
+      for (const n of nodes) {
+        const el = n.nodeType === 1 ? n : n.parentElement;
+        if (el && added.length < 500) added.push({t: t, el: el});
+      }
+    }
+  });
+  window.__leaflowAddObserver.observe(document.documentElement || document, {
+    childList: true, subtree: true, characterData: true
+  });
+}
+"""
+
+WAIT_CHANGES_SCRIPT = """
+const toastSelector = arguments[0];
+const keywords = arguments[1] || [];
+const mark = window.__leaflowChangeMark;
+// 标记丢失说明点击后文档已被替换，页面本身就是新的
+if (mark === undefined) return document.readyState === 'complete' ? 'navigated' : null;
+const fresh = (window.__leaflowAdded || []).filter(e => e.t > mark && e.el.isConnected);
+for (const e of fresh) {
+  const el = e.el;
+  const toast = el.matches(toastSelector) ? el : (el.closest(toastSelector) || el.querySelector(toastSelector));
+  if (toast && (toast.innerText || '').trim()) return 'toast';
+}
+for (const e of fresh) {
+  const text = e.el.innerText || e.el.textContent || '';
+  for (const k of keywords) { if (text.includes(k)) return k; }
+}
+return null;
+"""
+
+class DomSnapshot:
+    """单次 execute_script 采集的页面快照
+
+    所有 XPath/CSS 选择器在浏览器内一次性求值，元素的文本、角色、类名、
+    可见/可用状态随结果一起返回，关键字匹配在 Python 端完成。
+    """
+
+    def __init__(self, data):
+        data = data or {}
+        self.items = data.get('items') or []
+        self.matches = data.get('matches') or {}
+        self.url = data.get('url') or ''
+        self.iframe_count = data.get('iframes') or 0
+        self.body_text = data.get('bodyText') or ''
+
+    def elements(self, selector, visible=None, enabled=None):
+        """按文档顺序返回选择器匹配到的元素信息（dict，el 为 WebElement）"""
+        for idx in self.matches.get(selector, []):
+            item = self.items[idx]
+            if visible is not None and item.get('visible') != visible:
+                continue
+            if enabled is not None and item.get('enabled') != enabled:
+                continue
+            yield item
+
+    def first(self, selectors, visible=True, predicate=None):
+        """返回第一个满足条件的 (selector, item)，找不到时返回 (None, None)"""
+        for selector in selectors:
+            for item in self.elements(selector, visible=visible):
+                if predicate is None or predicate(item):
+                    return selector, item
+        return None, None
+
+class BalanceTracker:
+    """记录最近一次读到的余额、读取时间和来源页面，避免重复加载控制台"""
+
+    def __init__(self):
+        self.value = None
+        self.read_at = None
+        self.source = None
+        self.valid = False
+
+    def update(self, value, source):
+        self.value = float(value)
+        self.read_at = time.time()
+        self.source = source
+        self.valid = True
+
+    def add(self, amount, source="computed"):
+        """在已知余额上累加奖励金额（无需重新读取页面）"""
+        if self.value is not None:
+            self.update(round(self.value + float(amount), 2), source)
+
+    def invalidate(self):
+        """余额可能已变化（例如刚完成签到），下次读取需重新加载"""
+        self.valid = False
+
+    def is_valid(self):
+        return self.valid and self.value is not None
+
+    @property
+    def text(self):
+        return f"{self.value:g}元" if self.value is not None else "未知"
+
+def _account_label(email):
+    """报告中使用的账号标识：脱敏邮箱加短哈希，避免重名"""
+    return f"{_mask_email(email)}#{_account_key(email)[:6]}"
+
+class RunReport:
+    """记录每个账号、每次尝试中各阶段的耗时，运行结束后输出 JSON 报告"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.accounts = {}
+        self.run_phases = []
+        self.extra = {}
+
+    def record(self, name, duration, ok=True, account=None, attempt=1):
+        entry = {'phase': name, 'seconds': round(duration, 3), 'ok': ok}
+        with self._lock:
+            if account is None:
+                self.run_phases.append(entry)
+                return
+            data = self.accounts.setdefault(account, {'attempts': {}, 'result': None})
+            data['attempts'].setdefault(str(attempt), []).append(entry)
+
+    @contextmanager
+    def phase(self, name, account=None, attempt=1):
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.record(name, time.perf_counter() - start, ok, account, attempt)
+
+    def merge_account(self, account, data, attempt_offset=0):
+        """合并子进程记录的账号阶段耗时，尝试次数按 attempt_offset 顺延"""
+        with self._lock:
+            target = self.accounts.setdefault(account, {'attempts': {}, 'result': None})
+            for attempt, entries in (data or {}).get('attempts', {}).items():
+                target['attempts'].setdefault(str(int(attempt) + attempt_offset), []).extend(entries)
+
+    def set_result(self, account, success, result, seconds=None):
+        with self._lock:
+            data = self.accounts.setdefault(account, {'attempts': {}, 'result': None})
+            data['result'] = {'success': success, 'message': str(result)}
+            if seconds is not None:
+                data['seconds'] = round(seconds, 3)
+
+    def _phase_totals(self):
+        totals = {}
+        entries = list(self.run_phases)
+        for data in self.accounts.values():
+            for attempt_entries in data['attempts'].values():
+                entries.extend(attempt_entries)
+        for entry in entries:
+            total = totals.setdefault(entry['phase'], {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'failures': 0})
+            total['count'] += 1
+            total['total_seconds'] = round(total['total_seconds'] + entry['seconds'], 3)
+            total['max_seconds'] = max(total['max_seconds'], entry['seconds'])
+            if not entry['ok']:
+                total['failures'] += 1
+        for total in totals.values():
+            total['avg_seconds'] = round(total['total_seconds'] / total['count'], 3)
+        return totals
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+                'total_seconds': round(time.time() - self.started_at, 3),
+                'phase_totals': self._phase_totals(),
+                'run_phases': list(self.run_phases),
+                'accounts': json.loads(json.dumps(self.accounts)),
+                **self.extra,
+            }
+
+    def write(self, path=None):
+        path = path or os.getenv('LEAFLOW_REPORT_PATH', 'leaflow_report.json')
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            logger.info(f"运行报告已写入: {path}")
+        except Exception as e:
+            logger.warning(f"写入运行报告失败: {e}")
+
+RUN_REPORT = RunReport()
+
+def timed_phase(name):
+    """方法装饰器：将耗时记录到 RUN_REPORT（账号级方法按账号和尝试次数归档）"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            account = getattr(self, 'report_label', None)
+            attempt = getattr(self, 'attempt', 1)
+            with RUN_REPORT.phase(name, account, attempt):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+class HostRateLimiter:
+    """按主机的令牌桶限速器（AIMD）
+
+    请求成功时速率线性上调直至上限，遇到 429/5xx/超时时速率减半，
+    并进入带随机抖动的指数退避窗口，期间该主机的所有请求都会等待。
+    初始速率和突发容量足够单账号流程不排队，只有服务端出现限流信号后才真正收紧。
+    """
+
+    THROTTLE_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, rate=None, min_rate=None, max_rate=None, burst=None):
+        self.initial_rate = rate if rate is not None else _env_float('LEAFLOW_RATE_LIMIT', 4.0, minimum=0.05)
+        self.min_rate = min_rate if min_rate is not None else _env_float('LEAFLOW_RATE_MIN', 0.2, minimum=0.01)
+        self.max_rate = max_rate if max_rate is not None else _env_float('LEAFLOW_RATE_MAX', 8.0, minimum=self.min_rate)
+        self.burst = burst if burst is not None else _env_int('LEAFLOW_RATE_BURST', 8, minimum=1)
+        self.increase = 0.1
+        self.backoff_base = 2.0
+        self.backoff_max = 60.0
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    @staticmethod
+    def host_of(url):
+        return (urlparse(url).hostname or url or '').lower()
+
+    def _bucket(self, host):
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            rate = min(max(self.initial_rate, self.min_rate), self.max_rate)
+            bucket = {'rate': rate, 'tokens': float(self.burst), 'updated': time.monotonic(),
+                      'failures': 0, 'blocked_until': 0.0, 'requests': 0, 'throttled': 0, 'waited': 0.0}
+            self._hosts[host] = bucket
+        return bucket
+
+    def _jitter(self, delay):
+        return delay * random.uniform(0.5, 1.0)
+
+    def acquire(self, url):
+        """等待直到该主机有可用令牌，返回等待的秒数"""
+        host = self.host_of(url)
+        waited = 0.0
+        while True:
+            with self._lock:
+                bucket = self._bucket(host)
+                now = time.monotonic()
+                bucket['tokens'] = min(self.burst, bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+                bucket['updated'] = now
+                if now >= bucket['blocked_until'] and bucket['tokens'] >= 1:
+                    bucket['tokens'] -= 1
+                    bucket['requests'] += 1
+                    bucket['waited'] += waited
+                    return waited
+                delay = max(bucket['blocked_until'] - now, (1 - bucket['tokens']) / bucket['rate'])
+            # 加少量抖动，避免多个线程在同一时刻醒来
+            delay += random.uniform(0, 0.1)
+            time.sleep(delay)
+            waited += delay
+
+    def report(self, url, ok, status=None, retry_after=None):
+        """反馈请求结果：成功时加性增速，被限流或失败时乘性降速并退避"""
+        host = self.host_of(url)
+        with self._lock:
+            bucket = self._bucket(host)
+            if ok and status not in self.THROTTLE_STATUS:
+                bucket['failures'] = 0
+                bucket['rate'] = min(self.max_rate, bucket['rate'] + self.increase)
+                return
+            bucket['failures'] += 1
+            bucket['throttled'] += 1
+            bucket['rate'] = max(self.min_rate, bucket['rate'] / 2)
+            bucket['tokens'] = min(bucket['tokens'], 0.0)
+            delay = retry_after if retry_after else self._jitter(
+                min(self.backoff_max, self.backoff_base * 2 ** (bucket['failures'] - 1)))
+            bucket['blocked_until'] = max(bucket['blocked_until'], time.monotonic() + delay)
+            logger.warning(f"[限速] {host} 请求异常（{status or '失败'}），速率降至 {bucket['rate']:.2f}/s，退避 {delay:.1f} 秒")
+
+    def backoff_delay(self, url, attempt):
+        """重试前的退避时长：指数增长加随机抖动，并与该主机当前的退避窗口取较大值"""
+        delay = self._jitter(min(self.backoff_max, self.backoff_base * 2 ** max(0, attempt - 1)))
+        with self._lock:
+            blocked = self._bucket(self.host_of(url))['blocked_until'] - time.monotonic()
+        return max(delay, blocked)
+
+    def backoff(self, url, attempt):
+        delay = self.backoff_delay(url, attempt)
+        time.sleep(delay)
+        return delay
+
+    def account_gap(self, url):
+        """账号之间的间隔：主机健康时只保留一个请求间隔的抖动，退避中则等待窗口结束"""
+        with self._lock:
+            bucket = self._bucket(self.host_of(url))
+            return max(bucket['blocked_until'] - time.monotonic(), self._jitter(1 / bucket['rate']))
+
+    def summary(self):
+        with self._lock:
+            return {
+                host: {
+                    'rate': round(bucket['rate'], 2),
+                    'requests': bucket['requests'],
+                    'throttled': bucket['throttled'],
+                    'waited_seconds': round(bucket['waited'], 2),
+                }
+                for host, bucket in self._hosts.items()
+            }
+
+RATE_LIMITER = HostRateLimiter()
+
+def _retry_after(response):
+    value = response.headers.get('Retry-After', '')
+    try:
+        return min(float(value), 120.0) if value else None
+    except ValueError:
+        return None
+
+def load_checkin_urls():
+    """从环境变量读取签到地址（去重保序），未配置时使用默认地址"""
+    urls = []
+    raw_urls = os.getenv('LEAFLOW_CHECKIN_URLS', '').strip()
+    raw_url = os.getenv('LEAFLOW_CHECKIN_URL', '').strip()
+
+    if raw_urls:
+        urls.extend([u.strip() for u in raw_urls.split(',') if u.strip()])
+    if raw_url:
+        urls.append(raw_url)
+
+    if not urls:
+        urls = [DEFAULT_CHECKIN_URL]
+
+    deduped = []
+    seen = set()
+    for url in urls:
+        if url not in seen:
+            deduped.append(url)
+            seen.add(url)
+    return deduped
+
+class EndpointHealth:
+    """签到入口健康探测：每次运行并发探测一次，按可用性和延迟排序
+
+    探测结果（延迟的滑动平均、连续失败次数）保存在状态目录中，
+    未探测时使用历史排名；本次探测不可用的地址对所有账号跳过。
+    """
+
+    def __init__(self, path=None, timeout=None):
+        self.file = JsonStateFile(path or _state_path('endpoints.json'))
+        self.timeout = timeout if timeout is not None else _env_int('LEAFLOW_PROBE_TIMEOUT', 5, minimum=1)
+        self.history = {}
+        self.alive = {}
+
+    def _probe_one(self, session, url):
+        RATE_LIMITER.acquire(url)
+        start = time.perf_counter()
+        try:
+            response = session.head(url, timeout=self.timeout, allow_redirects=True)
+            if response.status_code in (405, 501):
+                response = session.get(url, timeout=self.timeout, allow_redirects=True, stream=True)
+                response.close()
+        except requests.RequestException as e:
+            RATE_LIMITER.report(url, False)
+            return False, None, type(e).__name__
+        latency = time.perf_counter() - start
+        RATE_LIMITER.report(url, True, response.status_code, _retry_after(response))
+        # 未登录时跳转到登录页也说明入口可达，只有 5xx 视为不可用
+        return response.status_code < 500, latency, response.status_code
+
+    def probe(self, urls):
+        """并发探测所有地址并持久化结果，返回按健康度排序后的地址"""
+        _load_requests()
+        session = requests.Session()
+        session.headers['User-Agent'] = LeaflowHttpClient.USER_AGENT
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, len(urls)), thread_name_prefix="probe") as executor:
+                results = dict(zip(urls, executor.map(lambda url: self._probe_one(session, url), urls)))
+        finally:
+            session.close()
+
+        def _save(data):
+            now = time.time()
+            for url, (ok, latency, status) in results.items():
+                entry = data.setdefault(url, {'latency': None, 'failures': 0})
+                if ok:
+                    previous = entry.get('latency')
+                    entry['latency'] = round(latency if previous is None else 0.7 * previous + 0.3 * latency, 3)
+                    entry['failures'] = 0
+                else:
+                    entry['failures'] = entry.get('failures', 0) + 1
+                entry['status'] = status
+                entry['checked_at'] = int(now)
+            return dict(data)
+
+        try:
+            self.history = self.file.update(_save)
+        except Exception as e:
+            logger.warning(f"保存入口探测结果失败: {e}")
+        self.alive = {url: ok for url, (ok, _, _) in results.items()}
+        for url, (ok, latency, status) in results.items():
+            if ok:
+                logger.info(f"入口探测: {url} 可用，延迟 {latency * 1000:.0f} ms")
+            else:
+                logger.warning(f"入口探测: {url} 不可用（{status}），本次运行将跳过")
+        RUN_REPORT.extra['endpoints'] = {
+            url: {'alive': ok, 'latency_ms': round(latency * 1000) if latency else None, 'status': status}
+            for url, (ok, latency, status) in results.items()
+        }
+        return self.rank(urls)
+
+    def is_alive(self, url):
+        """未探测过的地址视为可用"""
+        return self.alive.get(url, True)
+
+    def rank(self, urls):
+        """可用地址按延迟升序；若全部不可用则保留原顺序，避免无地址可试"""
+        history = self.history or self.file.load()
+
+        def _key(item):
+            index, url = item
+            entry = history.get(url) or {}
+            latency = entry.get('latency')
+            return (entry.get('failures', 0) > 0, latency is None, latency or 0, index)
+
+        ranked = [url for _, url in sorted(enumerate(urls), key=_key)]
+        alive = [url for url in ranked if self.is_alive(url)]
+        return alive or list(urls)
+
+ENDPOINTS = EndpointHealth()
+
+def _parse_cookie_string(cookie_str):
+    """解析 "a=1; b=2" 格式的 Cookie 字符串"""
+    cookies = []
+    for item in (cookie_str or '').split(';'):
+        if '=' in item:
+            name, value = item.strip().split('=', 1)
+            if name:
+                cookies.append((name, value))
+    return cookies
+
+# 默认拦截的非核心资源（字体、统计等），可通过 LEAFLOW_BLOCK_URLS 追加
+DEFAULT_BLOCKED_URLS = [
+    "*fonts.googleapis.com*",
+    "*fonts.gstatic.com*",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*hm.baidu.com*",
+    "*clarity.ms*",
+]
+FONT_URL_PATTERNS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot"]
+IMAGE_URL_PATTERNS = ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico"]
+# CDP 不会返回被拦截请求的实际大小，按资源类型估算节省的流量（字节）
+BLOCKED_SIZE_ESTIMATES = {
+    "Font": 40000,
+    "Image": 30000,
+    "Script": 80000,
+    "Stylesheet": 20000,
+    "XHR": 2000,
+    "Fetch": 2000,
+    "Other": 10000,
+}
+
+def blocked_url_patterns():
+    """根据环境变量生成需要拦截的 URL 模式列表"""
+    if not _env_bool('LEAFLOW_BLOCK_RESOURCES', True):
+        return []
+    patterns = list(DEFAULT_BLOCKED_URLS)
+    if _env_bool('LEAFLOW_BLOCK_FONTS', True):
+        patterns.extend(FONT_URL_PATTERNS)
+    if _env_bool('LEAFLOW_BLOCK_IMAGES'):
+        patterns.extend(IMAGE_URL_PATTERNS)
+    patterns.extend(u.strip() for u in os.getenv('LEAFLOW_BLOCK_URLS', '').split(',') if u.strip())
+    return list(dict.fromkeys(patterns))
+
+def block_stats_enabled():
+    """是否统计被拦截的请求：需要开启 Chrome performance 日志，有额外开销，默认关闭"""
+    return bool(blocked_url_patterns()) and _env_bool('LEAFLOW_BLOCK_STATS')
+
+def apply_network_blocking(driver):
+    """通过 CDP Network.setBlockedURLs 对当前页面目标启用资源拦截"""
+    patterns = blocked_url_patterns()
+    if not patterns:
+        return False
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        return True
+    except Exception as e:
+        logger.warning(f"启用资源拦截失败: {e}")
+        return False
+
+class NetworkBlockStats:
+    """汇总整个运行期间被拦截的请求数和估算节省的字节数（仅 LEAFLOW_BLOCK_STATS 开启时统计）
+
+    请求数来自 performance 日志，是实际值；字节数按 BLOCKED_SIZE_ESTIMATES 估算，并非实测。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+        self.by_type = {}
+
+    def collect(self, driver):
+        """读取并清空驱动的 performance 日志，统计被拦截的请求"""
+        try:
+            entries = driver.get_log('performance')
+        except Exception:
+            return 0, 0
+        count = 0
+        size = 0
+        by_type = {}
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except Exception:
+                continue
+            if message.get('method') != 'Network.loadingFailed':
+                continue
+            params = message.get('params', {})
+            if not params.get('blockedReason'):
+                continue
+            resource_type = params.get('type') or 'Other'
+            count += 1
+            size += BLOCKED_SIZE_ESTIMATES.get(resource_type, BLOCKED_SIZE_ESTIMATES['Other'])
+            by_type[resource_type] = by_type.get(resource_type, 0) + 1
+        with self._lock:
+            self.requests += count
+            self.bytes += size
+            for resource_type, n in by_type.items():
+                self.by_type[resource_type] = self.by_type.get(resource_type, 0) + n
+        return count, size
+
+    def merge(self, summary):
+        """合并子进程的统计结果"""
+        with self._lock:
+            self.requests += summary.get('blocked_requests', 0)
+            self.bytes += summary.get('estimated_bytes_saved', 0)
+            for resource_type, n in (summary.get('by_type') or {}).items():
+                self.by_type[resource_type] = self.by_type.get(resource_type, 0) + n
+
+    def summary(self):
+        with self._lock:
+            return {
+                'blocked_requests': self.requests,
+                'estimated_bytes_saved': self.bytes,
+                'by_type': dict(self.by_type),
+                'estimated_bytes_saved_by_type': {
+                    resource_type: n * BLOCKED_SIZE_ESTIMATES.get(resource_type, BLOCKED_SIZE_ESTIMATES['Other'])
+                    for resource_type, n in self.by_type.items()
+                },
+            }
+
+BLOCK_STATS = NetworkBlockStats()
+
+class ArtifactManager:
+    """截图管理：按 LEAFLOW_SCREENSHOT_MODE 决定是否截图，JPEG 压缩后在后台线程写盘
+
+    模式：always（所有步骤）、failure（仅失败现场，默认）、sample（按比例抽样账号记录全部步骤，
+    其余账号仅保存失败现场）、off。文件名包含账号标识和尝试次数，总大小受预算限制。
+    """
+
+    MODES = ('always', 'failure', 'sample', 'off')
+
+    def __init__(self):
+        mode = os.getenv('LEAFLOW_SCREENSHOT_MODE', 'failure').strip().lower() or 'failure'
+        if mode not in self.MODES:
+            logger.warning(f"未知的截图模式 {mode}，使用 failure")
+            mode = 'failure'
+        self.mode = mode
+        self.sample_rate = _env_float('LEAFLOW_SCREENSHOT_SAMPLE', 0.1, minimum=0.0)
+        self.quality = min(100, _env_int('LEAFLOW_SCREENSHOT_QUALITY', 60, minimum=1))
+        self.budget = _env_int('LEAFLOW_ARTIFACT_BUDGET_MB', 20, minimum=0) * 1024 * 1024
+        self.directory = os.getenv('LEAFLOW_ARTIFACT_DIR', 'artifacts')
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = []
+        self._used = None
+        self._seq = 0
+        self.stats = {'saved': 0, 'bytes': 0, 'dropped_over_budget': 0, 'errors': 0}
+
+    def wants_steps(self):
+        """为单个账号决定是否记录过程截图（点击前后、最终状态）"""
+        if self.mode == 'always':
+            return True
+        return self.mode == 'sample' and random.random() < self.sample_rate
+
+    def _directory_size(self):
+        total = 0
+        try:
+            for entry in os.scandir(self.directory):
+                if entry.is_file():
+                    total += entry.stat().st_size
+        except OSError:
+            pass
+        return total
+
+    def _write(self, path, encoded):
+        try:
+            data = base64.b64decode(encoded)
+            with self._lock:
+                if self._used is None:
+                    # 多进程模式下各子进程共享同一目录，按目录实际大小计算预算
+                    self._used = self._directory_size()
+                if self.budget and self._used + len(data) > self.budget:
+                    self.stats['dropped_over_budget'] += 1
+                    return
+                self._used += len(data)
+            os.makedirs(self.directory, exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            with self._lock:
+                self.stats['saved'] += 1
+                self.stats['bytes'] += len(data)
+            logger.info(f"已保存截图: {path}")
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.warning(f"保存截图失败 {path}: {e}")
+
+    def capture(self, driver, account, attempt, name, failure=False, steps=False):
+        """截图并放入后台写盘；不需要截图时直接返回，不产生任何浏览器调用"""
+        if self.mode == 'off' or not driver or not (failure or steps):
+            return
+        with self._lock:
+            if self.budget and self._used is not None and self._used >= self.budget:
+                self.stats['dropped_over_budget'] += 1
+                return
+        try:
+            try:
+                shot = driver.execute_cdp_cmd('Page.captureScreenshot', {'format': 'jpeg', 'quality': self.quality})
+                encoded, ext = shot['data'], 'jpg'
+            except Exception:
+                encoded, ext = driver.get_screenshot_as_base64(), 'png'
+        except Exception as e:
+            logger.warning(f"截图失败 ({name}): {e}")
+            return
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifacts")
+        safe_account = re.sub(r'[^\w.-]+', '_', account or 'run')
+        path = os.path.join(self.directory, f"{safe_account}_a{attempt}_{seq:03d}_{name}.{ext}")
+        self._futures.append(self._executor.submit(self._write, path, encoded))
+
+    def flush(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        for future in list(self._futures):
+            try:
+                future.result(timeout=max(0, deadline - time.monotonic()))
+            except Exception:
+                pass
+        self._futures = []
+        if self.stats['dropped_over_budget']:
+            logger.warning(f"截图总大小超过预算，已丢弃 {self.stats['dropped_over_budget']} 张")
+        return dict(self.stats, mode=self.mode)
+
+ARTIFACTS = ArtifactManager()
+
+class CachingProxy:
+    """本地缓存代理：浏览器流量经由它转发，不可变的静态资源缓存到磁盘，跨账号、跨运行复用
+
+    Leaflow 相关主机（及其子域，LEAFLOW_PROXY_HOSTS 可追加）的 HTTPS 流量用本地签发的证书解密后缓存；
+    证书由 openssl 生成，只通过 --ignore-certificate-errors-spki-list 对本程序启动的 Chrome 生效，
+    上游证书照常校验。其它主机直接转发加密流量；没有 openssl 时只缓存 HTTP 资源。
+    """
+
+    STATIC_EXTENSIONS = ('.js', '.mjs', '.css', '.woff', '.woff2', '.ttf', '.otf', '.svg',
+                         '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico')
+    HOP_HEADERS = {'connection', 'keep-alive', 'proxy-connection', 'proxy-authorization', 'proxy-authenticate',
+                   'te', 'trailer', 'trailers', 'transfer-encoding', 'upgrade', 'content-length'}
+    MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
+    def __init__(self):
+        self.directory = _state_path('proxy_cache')
+        self.cert_directory = _state_path('proxy_certs')
+        self.budget = _env_int('LEAFLOW_PROXY_CACHE_MB', 200, minimum=1) * 1024 * 1024
+        self.max_age = _env_int('LEAFLOW_PROXY_MAX_AGE_DAYS', 30, minimum=1) * 86400
+        self.address = None
+        self.spki = None
+        self.hosts = set()
+        self._server = None
+        self._lock = threading.Lock()
+        self._cert_lock = threading.Lock()
+        self._contexts = {}
+        self._upstream = threading.local()
+        self._size = 0
+        self.stats = {'requests': 0, 'asset_requests': 0, 'hits': 0, 'stored': 0, 'bytes_saved': 0,
+                      'bytes_fetched': 0, 'tunnels': 0, 'errors': 0}
+
+    def start(self):
+        """启动代理，返回 host:port；失败时返回 None，浏览器直接联网"""
+        from http.server import ThreadingHTTPServer
+        self.hosts = {urlparse(url).hostname for url in [BASE_URL] + load_checkin_urls() if urlparse(url).hostname}
+        self.hosts.update(h.strip().lower() for h in os.getenv('LEAFLOW_PROXY_HOSTS', '').split(',') if h.strip())
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._size = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+            self.spki = self._setup_certificates()
+            self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+            self._server.daemon_threads = True
+        except Exception as e:
+            logger.warning(f"启动缓存代理失败，浏览器将直接联网: {e}")
+            return None
+        threading.Thread(target=self._server.serve_forever, name='leaflow-proxy', daemon=True).start()
+        self.address = f"127.0.0.1:{self._server.server_port}"
+        logger.info(f"缓存代理已启动: {self.address}（缓存 {self._size / 1024 / 1024:.1f} MB，"
+                    f"{'解密 ' + ', '.join(sorted(self.hosts)) if self.spki else '仅 HTTP'}）")
+        return self.address
+
+    def attach(self, endpoint):
+        """子进程沿用主进程的代理（只配置浏览器参数，不启动服务）"""
+        if endpoint:
+            self.address, self.spki = endpoint
+
+    def endpoint(self):
+        return (self.address, self.spki) if self.address else None
+
+    def chrome_arguments(self):
+        if not self.address:
+            return []
+        args = [f'--proxy-server=http://{self.address}', '--proxy-bypass-list=<-loopback>']
+        if self.spki:
+            args.append(f'--ignore-certificate-errors-spki-list={self.spki}')
+        return args
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _openssl(self, *args):
+        subprocess.run(['openssl', *args], check=True, capture_output=True, timeout=30)
+
+    def _setup_certificates(self):
+        """生成（或复用）本地 CA 与叶子证书私钥，返回叶子公钥的 SPKI 指纹"""
+        if not shutil.which('openssl'):
+            logger.warning("未找到 openssl，缓存代理只处理 HTTP 资源")
+            return None
+        os.makedirs(self.cert_directory, exist_ok=True)
+        ca_key, ca_cert, leaf_key = (os.path.join(self.cert_directory, name) for name in ('ca.key', 'ca.crt', 'leaf.key'))
+        try:
+            if not (os.path.exists(ca_key) and os.path.exists(ca_cert)):
+                self._openssl('req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', ca_key, '-out', ca_cert,
+                              '-days', '3650', '-subj', '/CN=Leaflow Checkin Cache Proxy')
+            if not os.path.exists(leaf_key):
+                self._openssl('genrsa', '-out', leaf_key, '2048')
+            public_der = subprocess.run(['openssl', 'pkey', '-in', leaf_key, '-pubout', '-outform', 'DER'],
+                                        check=True, capture_output=True, timeout=30).stdout
+        except Exception as e:
+            logger.warning(f"生成代理证书失败，缓存代理只处理 HTTP 资源: {e}")
+            return None
+        return base64.b64encode(hashlib.sha256(public_der).digest()).decode('ascii')
+
+    def intercepts(self, host):
+        host = (host or '').lower()
+        return bool(self.spki) and any(host == h or host.endswith('.' + h) for h in self.hosts)
+
+    def _ssl_context(self, host):
+        """按主机签发证书并返回服务端 SSL 上下文"""
+        import ssl
+        with self._cert_lock:
+            if host in self._contexts:
+                return self._contexts[host]
+            cert = os.path.join(self.cert_directory, f"{host}.crt")
+            leaf_key = os.path.join(self.cert_directory, 'leaf.key')
+            if not os.path.exists(cert):
+                csr, ext = f"{cert}.csr", f"{cert}.ext"
+                with open(ext, 'w', encoding='utf-8') as f:
+                    f.write(f"subjectAltName=DNS:{host}\nextendedKeyUsage=serverAuth\n")
+                try:
+                    self._openssl('req', '-new', '-key', leaf_key, '-subj', f'/CN={host}', '-out', csr)
+                    self._openssl('x509', '-req', '-in', csr, '-CA', os.path.join(self.cert_directory, 'ca.crt'),
+                                  '-CAkey', os.path.join(self.cert_directory, 'ca.key'), '-set_serial',
+                                  str(int.from_bytes(os.urandom(8), 'big')), '-days', '397',
+                                  '-extfile', ext, '-out', cert)
+                finally:
+                    for path in (csr, ext):
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert, leaf_key)
+            self._contexts[host] = context
+            return context
+
+    def _count(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def _cache_path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.cache')
+
+    def is_asset(self, url):
+        return urlparse(url).path.lower().endswith(self.STATIC_EXTENSIONS)
+
+    def lookup(self, url):
+        """返回未过期的缓存 (status, headers, body)，没有时返回 None"""
+        path = self._cache_path(url)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline().decode('utf-8'))
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or meta.get('expires_at', 0) < time.time():
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return meta['status'], [tuple(h) for h in meta['headers']], body
+
+    def cache_seconds(self, url, status, headers):
+        """可缓存时返回缓存时长（秒），否则返回 0"""
+        values = {k.lower(): v for k, v in headers}
+        cache_control = values.get('cache-control', '').lower()
+        if status != 200 or 'set-cookie' in values or 'cookie' in values.get('vary', '').lower():
+            return 0
+        if any(token in cache_control for token in ('no-store', 'no-cache', 'private')):
+            return 0
+        match = self.MAX_AGE_PATTERN.search(cache_control)
+        max_age = int(match.group(1)) if match else 0
+        if 'immutable' in cache_control:
+            return min(self.max_age, max_age or self.max_age)
+        if self.is_asset(url) and max_age >= 86400:
+            return min(self.max_age, max_age)
+        return 0
+
+    def store(self, url, status, headers, body):
+        seconds = self.cache_seconds(url, status, headers)
+        if not seconds or len(body) > self.budget // 10:
+            return False
+        meta = {'url': url, 'status': status, 'expires_at': time.time() + seconds,
+                'headers': [[k, v] for k, v in headers if k.lower() not in self.HOP_HEADERS]}
+        path = self._cache_path(url)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8') + b'\n')
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.debug(f"写入代理缓存失败: {e}")
+            return False
+        self._count(stored=1)
+        with self._lock:
+            self._size += len(body)
+            over_budget = self._size > self.budget
+        if over_budget:
+            self._evict()
+        return True
+
+    def _evict(self):
+        """超出预算时按最近使用时间淘汰，直到降到预算的 80%"""
+        entries = sorted((e for e in os.scandir(self.directory) if e.name.endswith('.cache')),
+                         key=lambda e: e.stat().st_mtime)
+        size = sum(e.stat().st_size for e in entries)
+        for entry in entries:
+            if size <= self.budget * 0.8:
+                break
+            try:
+                size -= entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                pass
+        with self._lock:
+            self._size = size
+
+    def fetch(self, method, url, headers, body):
+        """转发到上游（按线程复用连接），返回 (status, reason, headers, body)"""
+        import http.client
+        import ssl
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.netloc)
+        connections = getattr(self._upstream, 'connections', None)
+        if connections is None:
+            connections = self._upstream.connections = {}
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        for attempt in range(2):
+            conn = connections.get(key)
+            reused = conn is not None
+            if conn is None:
+                if parsed.scheme == 'https':
+                    conn = http.client.HTTPSConnection(parsed.netloc, timeout=60, context=ssl.create_default_context())
+                else:
+                    conn = http.client.HTTPConnection(parsed.netloc, timeout=60)
+                connections[key] = conn
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                connections.pop(key, None)
+                # 复用的连接可能已被上游关闭，换新连接重试一次
+                if reused and attempt == 0:
+                    continue
+                raise
+            if response.will_close:
+                conn.close()
+                connections.pop(key, None)
+            return response.status, response.reason, response.getheaders(), data
+
+    def _handler_class(self):
+        from http.server import BaseHTTPRequestHandler
+        import select
+        import socket
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            origin = None
+
+            def log_message(self, *args):
+                pass
+
+            def do_CONNECT(self):
+                host, _, port = self.path.rpartition(':')
+                if proxy.intercepts(host):
+                    self.send_response(200, 'Connection Established')
+                    self.end_headers()
+                    try:
+                        connection = proxy._ssl_context(host).wrap_socket(self.connection, server_side=True)
+                    except Exception as e:
+                        logger.debug(f"代理 TLS 握手失败 {host}: {e}")
+                        self.close_connection = True
+                        return
+                    self.connection = connection
+                    self.rfile = connection.makefile('rb', self.rbufsize)
+                    self.wfile = connection.makefile('wb')
+                    self.origin = f"https://{host}" + ('' if port in ('', '443') else f":{port}")
+                    self.close_connection = False
+                    return
+                self._tunnel(host, int(port or 443))
+
+            def _tunnel(self, host, port):
+                try:
+                    upstream = socket.create_connection((host, port), timeout=30)
+                except OSError as e:
+                    self.send_error(502, str(e))
+                    return
+                proxy._count(tunnels=1)
+                self.send_response(200, 'Connection Established')
+                self.end_headers()
+                self._splice(upstream)
+
+            def _splice(self, upstream):
+                """双向转发原始字节直到任一端关闭"""
+                sockets = [self.connection, upstream]
+                try:
+                    while True:
+                        # TLS 套接字里已解密但未读取的数据不会触发 select
+                        readable = [sock for sock in sockets if getattr(sock, 'pending', lambda: 0)()]
+                        if not readable:
+                            readable, _, errored = select.select(sockets, [], sockets, 60)
+                            if errored or not readable:
+                                break
+                        for sock in readable:
+                            data = sock.recv(65536)
+                            if not data:
+                                return
+                            (upstream if sock is self.connection else self.connection).sendall(data)
+                except OSError:
+                    pass
+                finally:
+                    upstream.close()
+                    self.close_connection = True
+
+            def _upgrade(self, url):
+                """Upgrade/WebSocket 请求：原样转发握手后直接透传，不缓存也不改写"""
+                import ssl
+                parsed = urlparse(url)
+                https = parsed.scheme == 'https'
+                try:
+                    upstream = socket.create_connection((parsed.hostname, parsed.port or (443 if https else 80)), timeout=30)
+                    if https:
+                        upstream = ssl.create_default_context().wrap_socket(upstream, server_hostname=parsed.hostname)
+                except (OSError, ssl.SSLError) as e:
+                    self.send_error(502, str(e)[:200])
+                    return
+                proxy._count(tunnels=1)
+                path = parsed.path or '/'
+                if parsed.query:
+                    path += '?' + parsed.query
+                lines = [f"{self.command} {path} {self.request_version}"]
+                lines += [f"{k}: {v}" for k, v in self.headers.items()
+                          if not k.lower().startswith('proxy-')]
+                upstream.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+                self.wfile.flush()
+                self._splice(upstream)
+
+            def _relay(self):
+                url = (self.origin + self.path) if self.origin else self.path
+                if not url.startswith(('http://', 'https://')):
+                    self.send_error(501)
+                    return
+                if self.headers.get('Upgrade'):
+                    return self._upgrade(url)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else None
+                proxy._count(requests=1)
+
+                # 命中率只统计静态资源请求（或已有缓存的请求）
+                asset = self.command == 'GET' and proxy.is_asset(url)
+                cached = proxy.lookup(url) if self.command == 'GET' else None
+                if asset or cached:
+                    proxy._count(asset_requests=1)
+                if cached:
+                    status, headers, data = cached
+                    proxy._count(hits=1, bytes_saved=len(data))
+                    return self._respond(status, None, headers, data)
+
+                headers = {k: v for k, v in self.headers.items() if k.lower() not in proxy.HOP_HEADERS}
+                try:
+                    status, reason, headers, data = proxy.fetch(self.command, url, headers, body)
+                except Exception as e:
+                    proxy._count(errors=1)
+                    self.send_error(502, str(e)[:200])
+                    return
+                proxy._count(bytes_fetched=len(data))
+                if self.command == 'GET':
+                    proxy.store(url, status, headers, data)
+                self._respond(status, reason, headers, data)
+
+            def _respond(self, status, reason, headers, data):
+                # 上游的 Server 原样保留，Date 改为当前时间（缓存回放时上游 Date 已过期）
+                self.send_response_only(status, reason)
+                self.send_header('Date', self.date_time_string())
+                for key, value in headers:
+                    if key.lower() not in proxy.HOP_HEADERS and key.lower() != 'date':
+                        self.send_header(key, value)
+                if self.command == 'HEAD' or status in (204, 304) or status < 200:
+                    self.end_headers()
+                    return
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_OPTIONS = _relay
+
+        return Handler
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['cache_bytes'] = self._size
+        stats['hit_ratio'] = round(stats['hits'] / stats['asset_requests'], 3) if stats['asset_requests'] else None
+        return stats
+
+CACHE_PROXY = CachingProxy()
+
+def _binary_version(path):
+    """执行 `<binary> --version`，返回版本号字符串（如 120.0.6099.109），失败时返回 None"""
+    try:
+        output = subprocess.run([path, '--version'], capture_output=True, text=True, timeout=10).stdout
+    except Exception:
+        return None
+    match = re.search(r'(\d+)\.(\d+)\.(\d+)\.(\d+)', output or '')
+    return match.group(0) if match else None
+
+def _major(version):
+    return version.split('.', 1)[0] if version else None
+
+def _chrome_binary():
+    candidates = [os.getenv('CHROME_BIN')] + [
+        shutil.which(name) for name in ('google-chrome', 'google-chrome-stable', 'chrome', 'chromium', 'chromium-browser')
+    ]
+    return next((path for path in candidates if path and os.path.exists(path)), None)
+
+_DRIVER_PATH_LOCK = threading.Lock()
+_resolved_driver_path = None
+
+def resolve_chromedriver():
+    """解析 chromedriver 路径：每个进程只解析一次，结果缓存在状态目录中
+
+    缓存记录 Chrome 与 chromedriver 的版本，只有文件仍存在且主版本与当前 Chrome 一致时才复用；
+    否则依次尝试 CHROMEDRIVER_PATH、PATH 中版本匹配的 chromedriver 和 webdriver-manager。
+    全部失败时返回 None，由 Selenium Manager 自行解析。
+    """
+    global _resolved_driver_path
+    with _DRIVER_PATH_LOCK:
+        if _resolved_driver_path is not None:
+            return _resolved_driver_path or None
+
+        with RUN_REPORT.phase('resolve_chromedriver'):
+            cache = JsonStateFile(_state_path('chromedriver.json'))
+            chrome_binary = _chrome_binary()
+            chrome_version = _binary_version(chrome_binary) if chrome_binary else None
+            cached = cache.load()
+            if (cached.get('path') and os.path.exists(cached['path'])
+                    and (not chrome_version or _major(cached.get('chrome_version')) == _major(chrome_version))):
+                logger.info(f"使用缓存的 chromedriver: {cached['path']} ({cached.get('driver_version')})")
+                _resolved_driver_path = cached['path']
+                return _resolved_driver_path
+
+            path = None
+            system_chromedriver = os.getenv('CHROMEDRIVER_PATH')
+            if system_chromedriver and os.path.exists(system_chromedriver):
+                logger.info(f"Using system chromedriver at {system_chromedriver}")
+                path = system_chromedriver
+            else:
+                found = shutil.which('chromedriver')
+                if found and (not chrome_version or _major(_binary_version(found)) == _major(chrome_version)):
+                    path = found
+                else:
+                    try:
+                        logger.info("Using webdriver-manager to download chromedriver...")
+                        from webdriver_manager.chrome import ChromeDriverManager
+                        path = ChromeDriverManager().install()
+                    except Exception as e:
+                        logger.warning(f"webdriver-manager 解析 chromedriver 失败，交由 Selenium Manager 处理: {e}")
+
+            _resolved_driver_path = path or ''
+            if path:
+                driver_version = _binary_version(path)
+                try:
+                    cache.update(lambda data: data.update({
+                        'path': path,
+                        'driver_version': driver_version,
+                        'chrome_version': chrome_version,
+                        'resolved_at': int(time.time()),
+                    }))
+                except Exception as e:
+                    logger.warning(f"保存 chromedriver 缓存失败: {e}")
+                logger.info(f"chromedriver: {path} ({driver_version}), Chrome: {chrome_version}")
+            return path
+
+def _attach_chrome_driver(debugger_address):
+    """连接到已运行的 Chrome（共享浏览器模式），不启动新的浏览器进程"""
+    chrome_options = Options()
+    chrome_options.page_load_strategy = "eager"
+    chrome_options.add_experimental_option('debuggerAddress', debugger_address)
+    if block_stats_enabled():
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    driver_path = resolve_chromedriver()
+    service = Service(driver_path) if driver_path else Service()
+    driver = webdriver.Chrome(service=service, options=chrome_options)
+    try:
+        driver.set_page_load_timeout(60)
+        driver.set_script_timeout(30)
+    except Exception:
+        pass
+    return driver
+
+def create_chrome_driver(debugger_address=None):
+    """创建并配置一个新的Chrome驱动；指定 debugger_address 时连接已有浏览器"""
+    _load_selenium()
+    if debugger_address:
+        return _attach_chrome_driver(debugger_address)
+    logger.info(f"Checking environment: GITHUB_ACTIONS={os.getenv('GITHUB_ACTIONS')}, RUNNING_IN_DOCKER={os.getenv('RUNNING_IN_DOCKER')}")
+    
+    chrome_options = Options()
+    chrome_options.page_load_strategy = "eager"
+    chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+    chrome_options.add_argument('--lang=zh-CN')
+    chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_options.add_experimental_option('useAutomationExtension', False)
+
+    if block_stats_enabled():
+        # 用于统计被拦截的请求；performance 日志会记录全部网络事件，仅在需要统计时开启
+        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    if blocked_url_patterns():
+        if _env_bool('LEAFLOW_BLOCK_IMAGES'):
+            chrome_options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    
+    if os.getenv('GITHUB_ACTIONS') or os.getenv('RUNNING_IN_DOCKER'):
+        logger.info("Running in headless mode (CI/Docker)")
+    # 兼容沙盒环境，即使是非CI/Docker环境也使用headless和no-sandbox
+    chrome_options.add_argument('--headless=new')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--window-size=1920,1080')
+    for argument in CACHE_PROXY.chrome_arguments():
+        chrome_options.add_argument(argument)
+
+    system_chrome_bin = os.getenv('CHROME_BIN')
+    if system_chrome_bin:
+        logger.info(f"Setting Chrome binary location: {system_chrome_bin}")
+        chrome_options.binary_location = system_chrome_bin
+
+    try:
+        driver_path = resolve_chromedriver()
+        service = Service(driver_path) if driver_path else Service()
+        driver = webdriver.Chrome(service=service, options=chrome_options)
+        logger.info("ChromeDriver initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize ChromeDriver: {e}")
+        raise
+    
+    try:
+        driver.set_page_load_timeout(60)
+        driver.set_script_timeout(30)
+    except Exception:
+        pass
+
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    apply_network_blocking(driver)
+    return driver
+
+class DriverPool:
+    """Chrome驱动池：最多启动 size 个浏览器并在账号之间复用
+
+    归还时清理 Cookie/存储、关闭多余窗口；仅在浏览器崩溃或出现驱动超时时回收重建。
+    """
+
+    def __init__(self, size):
+        self.size = max(1, size)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._drivers = set()
+        self._created = 0
+        self._closed = False
+
+    def acquire(self, timeout=None):
+        """获取一个空闲驱动，池未满时新建"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("驱动池已关闭")
+            can_create = self._created < self.size
+            if can_create:
+                # 先计数占位，避免并发时超额创建
+                self._created += 1
+
+        if not can_create:
+            return self._idle.get(timeout=timeout)
+
+        try:
+            driver = create_chrome_driver()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._drivers.add(driver)
+        logger.info(f"驱动池新建浏览器 ({self._created}/{self.size})")
+        return driver
+
+    def release(self, driver, broken=False):
+        """归还驱动；重置失败或已损坏时直接回收"""
+        if driver is None:
+            return
+        if broken or self._closed:
+            self.discard(driver)
+            return
+        try:
+            self.reset_driver(driver)
+        except Exception as e:
+            logger.warning(f"重置浏览器状态失败，回收该浏览器: {e}")
+            self.discard(driver)
+            return
+        self._idle.put(driver)
+
+    def discard(self, driver):
+        """关闭并移出驱动池"""
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.discard(driver)
+                self._created -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def reset_driver(driver):
+        """清理上一个账号留下的浏览器状态"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.switch_to.default_content()
+
+        driver.delete_all_cookies()
+        # clearDataForOrigin 只接受具体的 origin，逐个清理主站和所有签到地址
+        origins = []
+        for url in [BASE_URL, DEFAULT_CHECKIN_URL] + load_checkin_urls():
+            parsed = urlparse(url)
+            origin = f"{parsed.scheme}://{parsed.netloc}"
+            if parsed.netloc and origin not in origins:
+                origins.append(origin)
+        commands = [("Network.clearBrowserCookies", {})]
+        commands += [("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"}) for origin in origins]
+        for command, params in commands:
+            try:
+                driver.execute_cdp_cmd(command, params)
+            except Exception:
+                pass
+        try:
+            driver.execute_script("try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}")
+        except Exception:
+            pass
+
+        driver.set_page_load_timeout(60)
+        driver.set_script_timeout(30)
+        driver.get("about:blank")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            drivers = list(self._drivers)
+            self._drivers.clear()
+            self._created = 0
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+class BrowserContextPool:
+    """共享浏览器池：所有账号共用一个 Chrome，每个账号使用独立的浏览器上下文
+
+    浏览器上下文（Target.createBrowserContext）拥有独立的 Cookie 和存储，相当于一个隐身窗口；
+    每个账号通过 debuggerAddress 连接到同一个 Chrome 的 WebDriver 会话，并切换到自己上下文中的标签页。
+    与 DriverPool 接口一致，归还时直接销毁上下文，会话留给下一个账号复用。
+    """
+
+    def __init__(self, size):
+        self.size = max(1, size)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._host_lock = threading.Lock()
+        self._host = None
+        self._address = None
+        self._sessions = set()
+        self._created = 0
+        self._active = 0
+        self._closed = False
+        self.stats = {'contexts': 0, 'peak_concurrent': 0, 'peak_rss_mb': 0.0, 'host_restarts': 0}
+
+    def _ensure_host(self):
+        """启动（或在崩溃后重启）共享 Chrome，返回其调试地址"""
+        with self._host_lock:
+            if self._host is not None:
+                try:
+                    self._host.execute_cdp_cmd('Browser.getVersion', {})
+                    return self._address
+                except Exception as e:
+                    logger.warning(f"共享浏览器已失效，重新启动: {e}")
+                    self.stats['host_restarts'] += 1
+                    self._reset_host()
+            self._host = create_chrome_driver()
+            self._address = self._host.capabilities.get('goog:chromeOptions', {}).get('debuggerAddress')
+            if not self._address:
+                raise RuntimeError("无法获取 Chrome 调试地址，不支持共享浏览器模式")
+            logger.info(f"共享浏览器已启动 ({self._address})")
+            return self._address
+
+    def _reset_host(self):
+        """丢弃失效的 Chrome 以及连接到它的所有会话"""
+        with self._lock:
+            sessions = list(self._sessions)
+            self._sessions.clear()
+            self._created = 0
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for driver in sessions + [self._host]:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        self._host = None
+        self._address = None
+
+    def _host_cdp(self, command, params):
+        with self._host_lock:
+            return self._host.execute_cdp_cmd(command, params)
+
+    def _new_session(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("驱动池已关闭")
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if not can_create:
+            return None
+        try:
+            driver = create_chrome_driver(debugger_address=self._ensure_host())
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._sessions.add(driver)
+        return driver
+
+    def acquire(self, timeout=None):
+        """取得一个会话并为其创建新的浏览器上下文和标签页"""
+        self._ensure_host()
+        try:
+            driver = self._idle.get_nowait()
+        except queue.Empty:
+            driver = self._new_session() or self._idle.get(timeout=timeout)
+
+        try:
+            context_id = self._host_cdp('Target.createBrowserContext', {})['browserContextId']
+            target_id = self._host_cdp('Target.createTarget', {
+                'url': 'about:blank', 'browserContextId': context_id, 'width': 1920, 'height': 1080,
+            })['targetId']
+            driver.leaflow_context_id = context_id
+            self._switch_to_target(driver, target_id)
+        except Exception:
+            self.discard(driver)
+            raise
+
+        try:
+            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        except Exception:
+            pass
+        apply_network_blocking(driver)
+        self._record_acquire()
+        return driver
+
+    @staticmethod
+    def _switch_to_target(driver, target_id, timeout=10):
+        """等待 chromedriver 发现新标签页并切换过去（窗口句柄即目标 ID，旧版本带 CDwindow- 前缀）"""
+        end_time = time.time() + timeout
+        while True:
+            for handle in driver.window_handles:
+                if handle.upper().endswith(target_id.upper()):
+                    driver.switch_to.window(handle)
+                    return
+            if time.time() >= end_time:
+                raise RuntimeError(f"找不到新建的标签页 {target_id}")
+            time.sleep(0.2)
+
+    def _record_acquire(self):
+        with self._lock:
+            self._active += 1
+            self.stats['contexts'] += 1
+            self.stats['peak_concurrent'] = max(self.stats['peak_concurrent'], self._active)
+        rss = _tree_rss_mb(os.getpid())
+        with self._lock:
+            self.stats['peak_rss_mb'] = max(self.stats['peak_rss_mb'], round(rss, 1))
+
+    def _dispose_context(self, driver):
+        context_id = getattr(driver, 'leaflow_context_id', None)
+        driver.leaflow_context_id = None
+        if not context_id:
+            return
+        with self._lock:
+            self._active = max(0, self._active - 1)
+        try:
+            self._host_cdp('Target.disposeBrowserContext', {'browserContextId': context_id})
+        except Exception as e:
+            logger.warning(f"销毁浏览器上下文失败: {e}")
+
+    def release(self, driver, broken=False):
+        """归还会话：销毁该账号的浏览器上下文（Cookie、存储和标签页随之清除）"""
+        if driver is None:
+            return
+        with self._lock:
+            stale = driver not in self._sessions
+        if broken or stale or self._closed:
+            self.discard(driver)
+            return
+        self._dispose_context(driver)
+        self._idle.put(driver)
+
+    def discard(self, driver):
+        """关闭会话；连接模式下 quit 只结束 chromedriver 会话，不会关闭共享的 Chrome"""
+        self._dispose_context(driver)
+        with self._lock:
+            if driver in self._sessions:
+                self._sessions.discard(driver)
+                self._created -= 1
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['sessions'] = self.size
+        if stats['peak_concurrent']:
+            stats['rss_mb_per_account'] = round(stats['peak_rss_mb'] / stats['peak_concurrent'], 1)
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        with self._host_lock:
+            self._reset_host()
+
+class CheckinResult:
+    """结构化的签到结果：status 为 success / already / failed / unknown，confidence 取值 0~1"""
+
+    def __init__(self, status='unknown', reward=None, balance=None, confidence=0.0, message=None, source=None):
+        self.status = status
+        self.reward = reward
+        self.balance = balance
+        self.confidence = confidence
+        self.source = source
+        self.message = message or self._default_message()
+
+    def _default_message(self):
+        if self.status == 'success' and self.reward is not None:
+            return f"签到成功！您获得了 {self.reward:g} 元奖励！"
+        if self.status == 'already':
+            return "今日已签到"
+        return "未检测到明确结果"
+
+    @property
+    def confirmed(self):
+        return self.status in ('success', 'already')
+
+    def to_dict(self):
+        return {
+            'status': self.status,
+            'reward': self.reward,
+            'balance': self.balance,
+            'confidence': self.confidence,
+            'message': self.message,
+            'source': self.source,
+        }
+
+class CheckinResultExtractor:
+    """签到结果解析：只处理一次采集到的文本/HTML，不访问浏览器和网络
+
+    输入为提示元素文本、页面全文和签到按钮状态，按可信度从高到低依次匹配：
+    提示元素 > 页面中的奖励 > 已签到文案（仅 page_already）> 当天签到记录 > 按钮状态。
+    """
+
+    REWARD_PATTERNS = (
+        re.compile(r'获得了?\s*(\d+\.?\d*)\s*元'),
+        re.compile(r'\+\s*(\d+\.?\d*)\s*元'),
+    )
+    AMOUNT_PATTERN = re.compile(r'(\d+\.?\d*)\s*元')
+    PLUS_AMOUNT_PATTERN = re.compile(r'\+\s*(\d+\.?\d*)')
+    HINT_PATTERN = re.compile(r'签到|成功|获得')
+    MESSAGE_HINT_PATTERN = re.compile(r'签到|成功')
+    FAILED_PATTERN = re.compile(r'签到失败|失败|错误')
+    ALREADY_PATTERN = re.compile(r'今日已签到|已经签到|已签到')
+    # 页面全文只采信明确的当天文案，“本月已签到 12 天”之类的日历/记录文本不算
+    TODAY_ALREADY_PATTERN = re.compile(r'今日已签到|已经签到')
+    BALANCE_PATTERN = re.compile(r'余额[^\d¥￥]{0,20}[¥￥]?\s*([\d,]+\.?\d*)')
+    SCRIPT_STYLE_PATTERN = re.compile(r'<(script|style)\b.*?</\1>', re.S | re.I)
+    BREAK_PATTERN = re.compile(r'<br\s*/?>|</(p|div|li|tr|h\d|button|span)>', re.I)
+    TAG_PATTERN = re.compile(r'<[^>]+>')
+    SPACE_PATTERN = re.compile(r'\s+')
+
+    @classmethod
+    def html_to_text(cls, page_html):
+        text = cls.SCRIPT_STYLE_PATTERN.sub(' ', page_html or '')
+        text = cls.BREAK_PATTERN.sub('\n', text)
+        text = cls.TAG_PATTERN.sub(' ', text)
+        lines = [cls.SPACE_PATTERN.sub(' ', line).strip() for line in html.unescape(text).split('\n')]
+        return '\n'.join(line for line in lines if line)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=8)
+    def _record_line_pattern(today):
+        return re.compile(rf'^[^\n]*{re.escape(today)}[^\n]*$', re.M)
+
+    @classmethod
+    def _reward(cls, text):
+        for pattern in cls.REWARD_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                return float(match.group(1))
+        return None
+
+    @classmethod
+    def _balance(cls, text):
+        match = cls.BALANCE_PATTERN.search(text)
+        if not match:
+            return None
+        try:
+            return float(match.group(1).replace(',', ''))
+        except ValueError:
+            return None
+
+    @classmethod
+    def extract(cls, messages=(), page_text='', button=None, today=None, page_already=False):
+        """messages 为提示元素文本列表，button 为签到按钮的 {'text', 'enabled'}，today 默认为本地日期
+
+        page_already=True 时页面全文中的“已签到”也视为已签到（HTTP 响应页面足够简单；
+        浏览器页面可能包含签到日历等文案，默认不采信）。
+        """
+        page_text = page_text or ''
+        balance = cls._balance(page_text)
+
+        # 1. 提示元素（弹窗 / toast）
+        for text in messages:
+            text = (text or '').strip()
+            if not text:
+                continue
+            reward = cls._reward(text)
+            if reward is None and cls.HINT_PATTERN.search(text):
+                match = cls.AMOUNT_PATTERN.search(text)
+                reward = float(match.group(1)) if match else None
+            if reward is not None and cls.HINT_PATTERN.search(text):
+                return CheckinResult('success', reward, balance, 0.95, source='message')
+            if cls.MESSAGE_HINT_PATTERN.search(text) and len(text) > 4:
+                if cls.ALREADY_PATTERN.search(text):
+                    status, confidence = 'already', 0.9
+                elif cls.FAILED_PATTERN.search(text):
+                    status, confidence = 'failed', 0.8
+                else:
+                    status, confidence = 'success', 0.6
+                return CheckinResult(status, None, balance, confidence, message=text, source='message')
+
+        # 2. 页面全文中的标准奖励格式
+        reward = cls._reward(page_text)
+        if reward is not None:
+            return CheckinResult('success', reward, balance, 0.9, source='page')
+
+        if page_already and cls.TODAY_ALREADY_PATTERN.search(page_text):
+            return CheckinResult('already', None, balance, 0.9, source='page')
+
+        # 3. 当天的签到记录行
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        for match in cls._record_line_pattern(today).finditer(page_text):
+            line = match.group(0).strip()
+            if "+" not in line and "元" not in line:
+                continue
+            amount = cls.AMOUNT_PATTERN.search(line) or cls.PLUS_AMOUNT_PATTERN.search(line)
+            if amount:
+                return CheckinResult('success', float(amount.group(1)), balance, 0.8, source='record')
+            return CheckinResult('success', None, balance, 0.5, message=f"签到成功！({line})", source='record')
+
+        # 4. 按钮状态
+        if button and (not button.get('enabled', True) or "已签到" in (button.get('text') or '')):
+            return CheckinResult('success', None, balance, 0.6, message="签到成功！(已签到)", source='button')
+
+        return CheckinResult('unknown', None, balance, 0.0, source=None)
+
+    @classmethod
+    def extract_html(cls, page_html, today=None):
+        """从页面 HTML 解析签到结果（HTTP 引擎与离线样本使用）"""
+        return cls.extract(page_text=cls.html_to_text(page_html), today=today, page_already=True)
+
+class LeaflowHttpClient:
+    """纯 HTTP 签到引擎：复用已有 Cookie 直接请求签到页与余额页
+
+    仅在能明确确认结果时返回结果，否则返回 None，由调用方回退到浏览器流程。
+    """
+
+    USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+    ALREADY_PATTERN = CheckinResultExtractor.TODAY_ALREADY_PATTERN
+    DISABLED_BUTTON_PATTERN = re.compile(r'<button\b([^>]*)>([^<]*)</button>', re.S | re.I)
+    BALANCE_PATTERN = CheckinResultExtractor.BALANCE_PATTERN
+    FORM_PATTERN = re.compile(r'<form\b([^>]*)>(.*?)</form>', re.S | re.I)
+    INPUT_PATTERN = re.compile(r'<(?:input|button)\b([^>]*)>', re.S | re.I)
+    ATTR_PATTERN = re.compile(r'([\w:-]+)(?:\s*=\s*("[^"]*"|\'[^\']*\'|[^\s>]+))?')
+    CSRF_META_PATTERN = re.compile(r'<meta[^>]+name=["\']csrf-token["\'][^>]+content=["\']([^"\']+)["\']', re.I)
+    DATA_PAGE_PATTERN = re.compile(r'data-page="([^"]+)"')
+
+    def __init__(self, cookies, base_url=None, checkin_urls=None, timeout=10):
+        self.base_url = (base_url or BASE_URL).rstrip('/')
+        self.checkin_urls = checkin_urls or [DEFAULT_CHECKIN_URL]
+        self.timeout = timeout
+
+        _load_requests()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=1)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': self.USER_AGENT,
+            'Accept-Language': 'zh-CN,zh;q=0.9',
+            'Accept': 'text/html,application/xhtml+xml,application/json;q=0.9,*/*;q=0.8',
+        })
+        self.set_cookies(cookies)
+
+    def set_cookies(self, cookies):
+        """支持 Cookie 字符串或 Selenium get_cookies() 的列表"""
+        if isinstance(cookies, str):
+            for name, value in _parse_cookie_string(cookies):
+                self.session.cookies.set(name, value)
+            return
+        for cookie in cookies or []:
+            kwargs = {}
+            if cookie.get('domain'):
+                kwargs['domain'] = cookie['domain']
+            if cookie.get('path'):
+                kwargs['path'] = cookie['path']
+            self.session.cookies.set(cookie['name'], cookie['value'], **kwargs)
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, url, **kwargs):
+        """经过按主机限速器发送请求，并把响应状态反馈给限速器"""
+        RATE_LIMITER.acquire(url)
+        try:
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            RATE_LIMITER.report(url, False)
+            raise
+        RATE_LIMITER.report(url, True, response.status_code, _retry_after(response))
+        return response
+
+    @staticmethod
+    def _is_login_page(response):
+        return "/login" in response.url
+
+    html_to_text = staticmethod(CheckinResultExtractor.html_to_text)
+
+    def _attrs(self, tag_attrs):
+        attrs = {}
+        for name, value in self.ATTR_PATTERN.findall(tag_attrs):
+            if value[:1] in ('"', "'"):
+                value = value[1:-1]
+            attrs[name.lower()] = html.unescape(value)
+        return attrs
+
+    def parse_checkin_text(self, text):
+        """从页面文本中识别签到结果，无法确认时返回 None"""
+        result = CheckinResultExtractor.extract(page_text=text, page_already=True)
+        # 只采信奖励文案和已签到文案，签到记录行等弱证据交给浏览器流程确认
+        if result.confidence >= 0.9 and result.confirmed:
+            return result.message
+        return None
+
+    def _already_checked_in(self, page_html):
+        """提交前只采信明确的当天已签到文案或已禁用的签到按钮"""
+        if self.ALREADY_PATTERN.search(self.html_to_text(page_html)):
+            return True
+        for button_attrs, button_text in self.DISABLED_BUTTON_PATTERN.findall(page_html):
+            attrs = self._attrs(button_attrs)
+            is_checkin = '签到' in button_text or 'checkin' in attrs.get('class', '').lower()
+            if is_checkin and 'disabled' in attrs:
+                return True
+        return False
+
+    def _find_checkin_form(self, page_html, page_url):
+        for form_attrs, form_body in self.FORM_PATTERN.findall(page_html):
+            if '签到' not in form_body and 'checkin' not in (form_attrs + form_body).lower():
+                continue
+            attrs = self._attrs(form_attrs)
+            data = {}
+            for input_attrs in self.INPUT_PATTERN.findall(form_body):
+                field = self._attrs(input_attrs)
+                name = field.get('name')
+                if not name:
+                    continue
+                if field.get('type', '').lower() in ('checkbox', 'radio') and 'checked' not in field:
+                    continue
+                data[name] = field.get('value', '')
+            action = urljoin(page_url, attrs.get('action') or page_url)
+            return attrs.get('method', 'post').lower(), action, data
+        return None
+
+    def checkin(self):
+        """直接请求签到页并提交签到表单"""
+        for url in self.checkin_urls:
+            try:
+                response = self._request('GET', url)
+            except requests.RequestException as e:
+                logger.warning(f"[HTTP] 访问签到页 {url} 失败: {e}")
+                continue
+
+            if response.status_code != 200 or self._is_login_page(response):
+                logger.info(f"[HTTP] 签到页不可用或登录态失效: {url} ({response.status_code})")
+                continue
+
+            if self._already_checked_in(response.text):
+                return "今日已签到"
+
+            form = self._find_checkin_form(response.text, response.url)
+            if not form:
+                logger.info(f"[HTTP] 未在 {url} 找到签到表单")
+                continue
+
+            method, action, data = form
+            headers = {'Referer': response.url}
+            csrf = self.CSRF_META_PATTERN.search(response.text)
+            if csrf:
+                headers['X-CSRF-TOKEN'] = csrf.group(1)
+            try:
+                if method == 'get':
+                    result = self._request('GET', action, params=data, headers=headers)
+                else:
+                    result = self._request('POST', action, data=data, headers=headers)
+            except requests.RequestException as e:
+                logger.warning(f"[HTTP] 提交签到失败: {e}")
+                continue
+
+            if self._is_login_page(result):
+                continue
+            message = self.parse_checkin_text(self.html_to_text(result.text))
+            if message:
+                return message
+            logger.info("[HTTP] 签到请求已提交，但无法从响应中确认结果")
+        return None
+
+    def _find_balance_in_props(self, node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if 'balance' in str(key).lower() and isinstance(value, (int, float, str)):
+                    try:
+                        return float(str(value).replace(',', ''))
+                    except ValueError:
+                        pass
+                found = self._find_balance_in_props(value)
+                if found is not None:
+                    return found
+        elif isinstance(node, list):
+            for item in node:
+                found = self._find_balance_in_props(item)
+                if found is not None:
+                    return found
+        return None
+
+    def get_balance(self):
+        """请求控制台页面解析余额，返回 "x元" 或 None"""
+        try:
+            response = self._request('GET', f"{self.base_url}/dashboard")
+        except requests.RequestException as e:
+            logger.warning(f"[HTTP] 获取余额失败: {e}")
+            return None
+        if response.status_code != 200 or self._is_login_page(response):
+            return None
+
+        data_page = self.DATA_PAGE_PATTERN.search(response.text)
+        if data_page:
+            try:
+                props = json.loads(html.unescape(data_page.group(1)))
+                balance = self._find_balance_in_props(props)
+                if balance is not None:
+                    return f"{balance:g}元"
+            except ValueError:
+                pass
+
+        match = self.BALANCE_PATTERN.search(self.html_to_text(response.text))
+        if match:
+            return f"{match.group(1).replace(',', '')}元"
+        return None
+
 class LeaflowAutoCheckin:
-    def __init__(self, email, password):
+    def __init__(self, email, password, driver_pool=None):
         self.email = email
         self.password = password
         self.telegram_bot_token = os.getenv('TELEGRAM_BOT_TOKEN', '')
@@ -49,115 +2443,83 @@ class LeaflowAutoCheckin:
         if not self.email or not self.password:
             raise ValueError("邮箱和密码不能为空")
         
+        self.driver_pool = driver_pool
         self.driver = None
-        self.setup_driver()
+        self._driver_broken = False
+        self.http_mode = _env_bool('LEAFLOW_HTTP_MODE')
+        self.session_store = SessionStore() if _env_bool('LEAFLOW_SESSION_CACHE', True) else None
+        self.balance = BalanceTracker()
+        self.report_label = _account_label(email)
+        self.attempt = 1
+        self.capture_steps = ARTIFACTS.wants_steps()
+        self.strategies = StrategyStore() if _env_bool('LEAFLOW_STRATEGY_LEARNING', True) else None
+        self.strategy = {}
+        self.explore = False
+        self.click_path = {}
 
+    @timed_phase('driver_startup')
     def setup_driver(self):
-        """设置Chrome驱动选项"""
-        logger.info(f"Checking environment: GITHUB_ACTIONS={os.getenv('GITHUB_ACTIONS')}, RUNNING_IN_DOCKER={os.getenv('RUNNING_IN_DOCKER')}")
-        
-        chrome_options = Options()
-        chrome_options.page_load_strategy = "eager"
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
-        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
-        chrome_options.add_argument('--lang=zh-CN')
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
-        
-        if os.getenv('GITHUB_ACTIONS') or os.getenv('RUNNING_IN_DOCKER'):
-            logger.info("Running in headless mode (CI/Docker)")
-            chrome_options.add_argument('--headless=new')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
-            
-            try:
-                system_chromedriver = os.getenv('CHROMEDRIVER_PATH')
-                system_chrome_bin = os.getenv('CHROME_BIN')
-
-                if system_chrome_bin:
-                    logger.info(f"Setting Chrome binary location: {system_chrome_bin}")
-                    chrome_options.binary_location = system_chrome_bin
+        """设置Chrome驱动，启用驱动池时从池中获取"""
+        self._driver_broken = False
+        _load_selenium()
+        if self.driver_pool:
+            self.driver = self.driver_pool.acquire()
+        else:
+            self.driver = create_chrome_driver()
 
-                if system_chromedriver and os.path.exists(system_chromedriver):
-                    logger.info(f"Using system chromedriver at {system_chromedriver}")
-                    service = Service(system_chromedriver)
-                else:
-                    logger.info("Using webdriver-manager to download chromedriver...")
-                    service = Service(ChromeDriverManager().install())
-                
-                self.driver = webdriver.Chrome(service=service, options=chrome_options)
-                logger.info("ChromeDriver initialized successfully")
-            except Exception as e:
-                logger.error(f"Failed to initialize ChromeDriver: {e}")
-                raise
+    def release_driver(self):
+        """归还或关闭当前驱动"""
+        driver, self.driver = self.driver, None
+        if not driver:
+            return
+        if block_stats_enabled():
+            blocked, saved = BLOCK_STATS.collect(driver)
+            if blocked:
+                logger.info(f"本账号拦截了 {blocked} 个非核心请求，估算节省 {saved / 1024:.0f} KB")
+        if self.driver_pool:
+            self.driver_pool.release(driver, broken=self._driver_broken)
         else:
-            # 兼容沙盒环境，即使是非CI/Docker环境也使用headless和no-sandbox
-            chrome_options.add_argument('--headless=new')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            chrome_options.add_argument('--disable-gpu')
-            chrome_options.add_argument('--window-size=1920,1080')
-            
             try:
-                self.driver = webdriver.Chrome(options=chrome_options)
+                driver.quit()
             except Exception:
-                logger.info("Direct ChromeDriver init failed, trying webdriver-manager...")
-                try:
-                    service = Service(ChromeDriverManager().install())
-                    self.driver = webdriver.Chrome(service=service, options=chrome_options)
-                except Exception as e:
-                    logger.error(f"Failed to initialize ChromeDriver: {e}")
-                    raise
-        
-        try:
-            self.driver.set_page_load_timeout(60)
-            self.driver.set_script_timeout(30)
-        except Exception:
-            pass
+                pass
 
-        self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        
     def _load_checkin_urls(self):
-        """Load check-in URLs from env, fallback to default."""
-        urls = []
-        raw_urls = os.getenv('LEAFLOW_CHECKIN_URLS', '').strip()
-        raw_url = os.getenv('LEAFLOW_CHECKIN_URL', '').strip()
-
-        if raw_urls:
-            urls.extend([u.strip() for u in raw_urls.split(',') if u.strip()])
-        if raw_url:
-            urls.append(raw_url)
-
-        if not urls:
-            urls = ["https://checkin.leaflow.net"]
-
-        deduped = []
-        seen = set()
-        for url in urls:
-            if url not in seen:
-                deduped.append(url)
-                seen.add(url)
-        return deduped
+        """签到地址按入口探测结果排序，跳过本次运行中不可用的地址"""
+        return ENDPOINTS.rank(load_checkin_urls())
+
+    def _window_handles(self):
+        """当前账号的窗口；共享浏览器模式下只保留本账号浏览器上下文中的标签页"""
+        handles = self.driver.window_handles
+        context_id = getattr(self.driver, 'leaflow_context_id', None)
+        if not context_id:
+            return handles
+        try:
+            targets = self.driver.execute_cdp_cmd('Target.getTargets', {}).get('targetInfos', [])
+        except Exception:
+            return handles
+        own = {t['targetId'].upper() for t in targets if t.get('browserContextId') == context_id}
+        return [h for h in handles if any(h.upper().endswith(target_id) for target_id in own)]
 
     def _switch_to_new_window(self, old_handles, timeout=10):
-        """Switch to new window if one appears."""
+        """Switch to new window if one appears (timeout=0 checks once)."""
         end_time = time.time() + timeout
-        while time.time() < end_time:
-            handles = self.driver.window_handles
+        while True:
+            handles = self._window_handles()
             if len(handles) > len(old_handles):
                 new_handles = [h for h in handles if h not in old_handles]
                 if new_handles:
                     self.driver.switch_to.window(new_handles[-1])
+                    apply_network_blocking(self.driver)
                     return True
+            if time.time() >= end_time:
+                return False
             time.sleep(0.5)
-        return False
 
     def _switch_to_iframe_with_keywords(self, keywords, timeout=10):
-        """Switch into iframe that contains any keyword text."""
+        """Switch into iframe that contains any keyword text (timeout=0 checks once)."""
         end_time = time.time() + timeout
-        while time.time() < end_time:
+        while True:
             iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
             for iframe in iframes:
                 matched = False
@@ -176,8 +2538,9 @@ class LeaflowAutoCheckin:
                 finally:
                     if not matched:
                         self.driver.switch_to.default_content()
+            if time.time() >= end_time:
+                return False
             time.sleep(0.5)
-        return False
 
     def _click_element(self, element):
         try:
@@ -271,16 +2634,9 @@ class LeaflowAutoCheckin:
         }
         return tryClick(document);
         """
-        end_time = time.time() + timeout
-        while time.time() < end_time:
-            try:
-                if self.driver.execute_script(script, texts):
-                    return True
-            except Exception:
-                pass
-            time.sleep(1)
-        return False
+        return bool(self._wait_until(lambda: self.driver.execute_script(script, texts), timeout=timeout, poll=0.25))
 
+    @timed_phase('open_checkin_from_workspaces')
     def open_checkin_from_workspaces(self):
         """Open check-in modal from workspaces page."""
         try:
@@ -290,12 +2646,12 @@ class LeaflowAutoCheckin:
             except Exception:
                 current_url = ""
 
-            if "https://leaflow.net/workspaces" not in current_url:
-                self.safe_get("https://leaflow.net/workspaces", max_retries=2, wait_between=3)
+            if f"{BASE_URL}/workspaces" not in current_url:
+                self.safe_get(f"{BASE_URL}/workspaces", max_retries=2)
             WebDriverWait(self.driver, 20).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
-            time.sleep(2)
+            self._wait_for_dom_stable(quiet_ms=300, timeout=2)
 
             # 点击“签到试用”按钮
             click_selectors = [
@@ -306,22 +2662,11 @@ class LeaflowAutoCheckin:
                 "//*[contains(text(), '签到')]"
             ]
 
-            target_btn = None
-            end_time = time.time() + 15
-            while time.time() < end_time and not target_btn:
-                for selector in click_selectors:
-                    try:
-                        elements = self.driver.find_elements(By.XPATH, selector)
-                        for element in elements:
-                            if element.is_displayed():
-                                target_btn = element
-                                break
-                        if target_btn:
-                            break
-                    except Exception:
-                        continue
-                if not target_btn:
-                    time.sleep(0.5)
+            def _find_entry():
+                _, item = self.take_snapshot(click_selectors).first(click_selectors)
+                return item['el'] if item else None
+
+            target_btn = self._wait_until(_find_entry, timeout=15, poll=0.5) or None
 
             if not target_btn:
                 logger.warning("未找到工作空间中的签到入口按钮，尝试使用 JS 模糊搜索...")
@@ -333,7 +2678,7 @@ class LeaflowAutoCheckin:
                 logger.warning("无法找到任何签到入口按钮")
                 return False
 
-            old_handles = set(self.driver.window_handles)
+            old_handles = set(self._window_handles())
             if target_btn is not True:
                 logger.info(f"点击签到入口: {target_btn.text if hasattr(target_btn, 'text') else 'Unknown'}")
                 if not self._click_element(target_btn):
@@ -343,32 +2688,31 @@ class LeaflowAutoCheckin:
                     except:
                         pass
 
-            # 点击后，等待“立即签到”按钮出现作为成功标志
+            # 点击后，等待新窗口或“立即签到”按钮出现作为成功标志
             logger.info("已点击签到入口，等待签到弹窗...")
-            
-            if self._switch_to_new_window(old_handles, timeout=5):
-                logger.info("检测到新窗口")
-                return True
 
             checkin_btn_keywords = ["立即签到", "签到"]
-            end_time = time.time() + 10
+            modal_selectors = [
+                f"//button[contains(., '{keyword}')] | //*[contains(text(), '{keyword}') and @role='button']"
+                for keyword in checkin_btn_keywords
+            ]
+            end_time = time.time() + 15
             while time.time() < end_time:
-                for keyword in checkin_btn_keywords:
-                    try:
-                        xpath = f"//button[contains(., '{keyword}')] | //*[contains(text(), '{keyword}') and @role='button']"
-                        btns = self.driver.find_elements(By.XPATH, xpath)
-                        for btn in btns:
-                            if btn.is_displayed():
-                                logger.info(f"在当前页面找到签到按钮: {keyword}")
-                                return True
-                    except:
-                        pass
+                if self._switch_to_new_window(old_handles, timeout=0):
+                    logger.info("检测到新窗口")
+                    return True
+
+                snapshot = self.take_snapshot(modal_selectors)
+                selector, _ = snapshot.first(modal_selectors)
+                if selector:
+                    logger.info(f"在当前页面找到签到按钮: {checkin_btn_keywords[modal_selectors.index(selector)]}")
+                    return True
                 
-                if self._switch_to_iframe_with_keywords(checkin_btn_keywords, timeout=1):
+                if snapshot.iframe_count and self._switch_to_iframe_with_keywords(checkin_btn_keywords, timeout=0):
                     logger.info("在 iframe 中找到签到弹窗")
                     return True
                 
-                time.sleep(1)
+                time.sleep(0.5)
 
             logger.warning("点击签到入口后，未在限定时间内检测到签到弹窗或按钮")
             return False
@@ -376,6 +2720,89 @@ class LeaflowAutoCheckin:
             logger.warning(f"打开工作空间签到入口失败: {e}")
             return False
 
+    def take_snapshot(self, selectors, include_body=False, text_limit=300):
+        """一次往返获取所有选择器的匹配结果，失败时返回空快照"""
+        try:
+            return DomSnapshot(self.driver.execute_script(
+                DOM_SNAPSHOT_SCRIPT, list(selectors), 100, text_limit, include_body
+            ))
+        except Exception as e:
+            logger.debug(f"页面快照失败: {e}")
+            return DomSnapshot(None)
+
+    def _wait_until(self, condition, timeout=10, poll=0.2):
+        """轮询 condition 直到返回真值或超时，超时返回 False（sleep 仅作为上限）"""
+        end_time = time.time() + timeout
+        while True:
+            try:
+                value = condition()
+                if value:
+                    return value
+            except Exception:
+                pass
+            if time.time() >= end_time:
+                return False
+            time.sleep(poll)
+
+    def _wait_for_page_ready(self, timeout=10):
+        """等待 document.readyState 进入 interactive/complete"""
+        return self._wait_until(
+            lambda: self.driver.execute_script("return document.readyState") in ("interactive", "complete"),
+            timeout=timeout,
+        )
+
+    def _wait_for_dom_stable(self, quiet_ms=500, timeout=5):
+        """等待 DOM 在 quiet_ms 内没有新的变动（MutationObserver 信号）"""
+        script = """
+        const quiet = arguments[0];
+        if (!window.__leaflowMutationObserver) {
+          window.__leaflowLastMutation = performance.now();
+          window.__leaflowMutationObserver = new MutationObserver(() => {
+            window.__leaflowLastMutation = performance.now();
+          });
+          window.__leaflowMutationObserver.observe(document.documentElement || document, {
+            childList: true, subtree: true, attributes: true, characterData: true
+          });
+        }
+        return performance.now() - window.__leaflowLastMutation >= quiet;
+        """
+        return self._wait_until(lambda: self.driver.execute_script(script, quiet_ms), timeout=timeout, poll=0.1)
+
+    def _wait_for_network_idle(self, idle_ms=500, timeout=5):
+        """等待 idle_ms 内没有新的资源请求完成（Resource Timing 信号）"""
+        script = """
+        const entries = performance.getEntriesByType('resource');
+        let last = 0;
+        for (const e of entries) last = Math.max(last, e.responseEnd || e.startTime);
+        return [entries.length, performance.now() - last];
+        """
+        state = {'count': None}
+
+        def _idle():
+            count, since_last = self.driver.execute_script(script)
+            stable = count == state['count']
+            state['count'] = count
+            return stable and since_last >= idle_ms
+        return self._wait_until(_idle, timeout=timeout, poll=0.1)
+
+    TOAST_SELECTOR = (".alert, .alert-success, [role='alert'], .toast, .notification, .modal-content, "
+                      ".ant-message-notice, .ant-notification-notice, .el-message, .el-notification, "
+                      "[class*='message'], [class*='success']")
+
+    def _mark_page_changes(self):
+        """点击前调用：记录时间标记，此后新增的节点才算作点击带来的变化"""
+        try:
+            self.driver.execute_script(MARK_CHANGES_SCRIPT)
+        except Exception as e:
+            logger.debug(f"安装页面变化标记失败: {e}")
+
+    def _wait_for_new_result(self, keywords=(), timeout=10):
+        """等待标记之后新增的提示/弹窗节点；关键字仅在新增节点的文本中匹配作为兜底"""
+        return self._wait_until(
+            lambda: self.driver.execute_script(WAIT_CHANGES_SCRIPT, self.TOAST_SELECTOR, list(keywords)),
+            timeout=timeout,
+        )
+
     def _stop_page_load(self):
         try:
             self.driver.execute_script("window.stop();")
@@ -388,19 +2815,34 @@ class LeaflowAutoCheckin:
         return ("HTTPConnectionPool" in message or "Read timed out" in message or "read timeout" in message)
 
     def restart_driver(self):
+        self._driver_broken = True
+        self.balance.invalidate()
+        self.release_driver()
+        self.setup_driver()
+
+    THROTTLE_TITLES = ('429', 'Too Many Requests', '502 Bad Gateway', '503 Service', '504 Gateway', 'Just a moment')
+
+    def _navigate(self, url):
+        """经过按主机限速器打开页面；超时或被限流时反馈给限速器"""
+        RATE_LIMITER.acquire(url)
         try:
-            if self.driver:
-                self.driver.quit()
+            self.driver.get(url)
+        except Exception:
+            RATE_LIMITER.report(url, False)
+            raise
+        title = ""
+        try:
+            title = self.driver.title or ""
         except Exception:
             pass
-        self.driver = None
-        self.setup_driver()
+        throttled = any(marker in title for marker in self.THROTTLE_TITLES)
+        RATE_LIMITER.report(url, not throttled, 429 if throttled else None)
 
-    def safe_get(self, url, max_retries=2, wait_between=3):
+    def safe_get(self, url, max_retries=2):
         last_error = None
         for attempt in range(max_retries + 1):
             try:
-                self.driver.get(url)
+                self._navigate(url)
                 return True
             except TimeoutException as e:
                 last_error = f"TimeoutException: {e}"
@@ -416,7 +2858,7 @@ class LeaflowAutoCheckin:
                 self._stop_page_load()
 
             if attempt < max_retries:
-                time.sleep(wait_between)
+                RATE_LIMITER.backoff(url, attempt + 1)
 
         raise Exception(f"Failed to load page: {url}. Last error: {last_error}")
 
@@ -424,13 +2866,13 @@ class LeaflowAutoCheckin:
         """关闭初始弹窗"""
         try:
             logger.info("尝试关闭初始弹窗...")
-            time.sleep(3)  # 等待弹窗加载
+            self._wait_for_dom_stable(quiet_ms=500, timeout=3)  # 等待弹窗加载
             
             try:
                 actions = ActionChains(self.driver)
                 actions.move_by_offset(10, 10).click().perform()
                 logger.info("已成功关闭弹窗")
-                time.sleep(2)
+                self._wait_for_dom_stable(quiet_ms=300, timeout=2)
                 return True
             except:
                 pass
@@ -451,26 +2893,94 @@ class LeaflowAutoCheckin:
         return WebDriverWait(self.driver, timeout).until(
             EC.presence_of_element_located((by, value))
         )
+
+    def find_clickable(self, role, selectors, timeout=5):
+        """按定位缓存查找可点击元素：先用短超时尝试上次命中的选择器，未命中再遍历完整列表"""
+        cached = LOCATORS.get(role, selectors)
+        if cached:
+            try:
+                element = self.wait_for_element_clickable(_locator_by(cached), cached, LOCATORS.fast_timeout)
+                LOCATORS.record(role, cached, cached)
+                return element
+            except Exception:
+                logger.info(f"缓存的定位器未命中 ({role})，遍历完整列表")
+        for selector in selectors:
+            try:
+                element = self.wait_for_element_clickable(_locator_by(selector), selector, timeout)
+                LOCATORS.record(role, selector, cached, hit=False)
+                return element
+            except Exception:
+                continue
+        LOCATORS.record(role, None, cached, hit=False)
+        return None
     
+    def _restore_session(self):
+        """从本地缓存恢复该账号的登录会话，落到登录页时视为失效"""
+        cookies = self.session_store.load(self.email) if self.session_store else None
+        if not cookies:
+            return False
+        try:
+            logger.info("检测到本地缓存会话，尝试恢复登录...")
+            self.safe_get(BASE_URL, max_retries=1)
+            for cookie in cookies:
+                try:
+                    self.driver.add_cookie(cookie)
+                except Exception:
+                    # 其它子域的 Cookie 无法在当前域写入，忽略
+                    pass
+
+            self.safe_get(f"{BASE_URL}/dashboard", max_retries=1)
+            try:
+                WebDriverWait(self.driver, 15).until(
+                    lambda driver: "/dashboard" in driver.current_url or "/login" in driver.current_url
+                )
+            except TimeoutException:
+                pass
+
+            if "/login" in self.driver.current_url:
+                logger.info("缓存会话已失效，回退到常规登录")
+                self.session_store.invalidate(self.email)
+                return False
+            logger.info("已通过缓存会话登录")
+            # 验证通过后立即写回当前 Cookie，刷新 saved_at 与服务端续期的 Cookie
+            self.save_session()
+            return True
+        except Exception as e:
+            logger.warning(f"恢复缓存会话出错: {e}")
+            return False
+
+    def save_session(self):
+        """保存当前浏览器 Cookie 供下次运行复用"""
+        if not self.session_store or not self.driver:
+            return
+        try:
+            self.session_store.save(self.email, self.driver.get_cookies())
+        except Exception as e:
+            logger.warning(f"保存会话缓存失败: {e}")
+
+    @timed_phase('login')
     def login(self):
         """执行登录流程，支持重试机制"""
+        if self._restore_session():
+            return True
+
         cookie_str = os.getenv('LEAFLOW_COOKIE')
         if cookie_str:
             try:
                 logger.info("检测到 LEAFLOW_COOKIE，尝试通过 Cookie 登录...")
-                self.driver.get("https://leaflow.net")
-                time.sleep(2)
+                self._navigate(BASE_URL)
+                self._wait_for_page_ready(timeout=2)
                 
-                for item in cookie_str.split(';'):
-                    if '=' in item:
-                        name, value = item.strip().split('=', 1)
-                        self.driver.add_cookie({'name': name, 'value': value})
+                for name, value in _parse_cookie_string(cookie_str):
+                    self.driver.add_cookie({'name': name, 'value': value})
                 
                 self.driver.refresh()
-                time.sleep(5)
+                self._wait_for_page_ready(timeout=5)
+                self._wait_for_network_idle(idle_ms=500, timeout=5)
                 
                 if "dashboard" in self.driver.current_url or "workspaces" in self.driver.current_url or "login" not in self.driver.current_url:
                     logger.info("Cookie 登录成功")
+                    self.save_session()
                     return True
                 else:
                     logger.warning("Cookie 登录失败，回退到常规登录")
@@ -483,19 +2993,18 @@ class LeaflowAutoCheckin:
             try:
                 logger.info(f"开始登录流程，第 {attempt + 1}/{max_retries} 次尝试...")
                 
-                self.driver.get("https://leaflow.net/login")
+                self._navigate(f"{BASE_URL}/login")
                 
                 WebDriverWait(self.driver, 40).until(
                     EC.presence_of_element_located((By.TAG_NAME, "body"))
                 )
                 
-                time.sleep(5)
+                self._wait_for_page_ready(timeout=5)
         
                 self.close_popup()
                 
                 try:
                     logger.info("查找邮箱输入框...")
-                    time.sleep(2)
                     email_selectors = [
                         "input[type='text']",
                         "input[type='email']", 
@@ -506,29 +3015,20 @@ class LeaflowAutoCheckin:
                         "input[name='username']"
                     ]
                     
-                    email_input = None
-                    for selector in email_selectors:
-                        try:
-                            email_input = self.wait_for_element_clickable(By.CSS_SELECTOR, selector, 5)
-                            logger.info(f"找到邮箱输入框")
-                            break
-                        except:
-                            continue
-                    
+                    email_input = self.find_clickable('login_email', email_selectors, 5)
                     if not email_input:
                         raise Exception("找不到邮箱输入框")
+                    logger.info(f"找到邮箱输入框")
                     
                     email_input.clear()
                     email_input.send_keys(self.email)
                     logger.info("邮箱输入完成")
-                    time.sleep(2)
                     
                 except Exception as e:
                     logger.error(f"输入邮箱时出错: {e}")
                     try:
                         self.driver.execute_script(f"document.querySelector('input[type=\"text\"], input[type=\"email\"]').value = '{self.email}';")
                         logger.info("通过JavaScript设置邮箱")
-                        time.sleep(2)
                     except:
                         raise Exception(f"无法输入邮箱: {e}")
                 
@@ -541,7 +3041,6 @@ class LeaflowAutoCheckin:
                     password_input.clear()
                     password_input.send_keys(self.password)
                     logger.info("密码输入完成")
-                    time.sleep(1)
                     
                 except TimeoutException:
                     raise Exception("找不到密码输入框")
@@ -552,7 +3051,13 @@ class LeaflowAutoCheckin:
                         EC.presence_of_element_located((By.CSS_SELECTOR, ".grecaptcha-badge"))
                     )
                     logger.info("检测到 reCAPTCHA 徽标，等待其处理...")
-                    time.sleep(5) # 给 reCAPTCHA 留出处理时间
+                    # 给 reCAPTCHA 留出处理时间，脚本就绪后立即继续
+                    self._wait_until(
+                        lambda: self.driver.execute_script(
+                            "return typeof grecaptcha !== 'undefined' && typeof grecaptcha.execute === 'function';"
+                        ),
+                        timeout=5,
+                    )
                 except TimeoutException:
                     logger.info("未检测到 reCAPTCHA 徽标")
                 except Exception as e:
@@ -568,20 +3073,10 @@ class LeaflowAutoCheckin:
                         "button[type='submit']"
                     ]
                     
-                    login_btn = None
-                    for selector in login_btn_selectors:
-                        try:
-                            if selector.startswith("//"):
-                                login_btn = self.wait_for_element_clickable(By.XPATH, selector, 5)
-                            else:
-                                login_btn = self.wait_for_element_clickable(By.CSS_SELECTOR, selector, 5)
-                            logger.info(f"找到登录按钮")
-                            break
-                        except:
-                            continue
-                    
+                    login_btn = self.find_clickable('login_button', login_btn_selectors, 5)
                     if not login_btn:
                         raise Exception("找不到登录按钮")
+                    logger.info(f"找到登录按钮")
                     
                     login_btn.click()
                     logger.info("已点击登录按钮")
@@ -598,6 +3093,7 @@ class LeaflowAutoCheckin:
                     current_url = self.driver.current_url
                     if "dashboard" in current_url or "workspaces" in current_url or "login" not in current_url:
                         logger.info(f"登录成功，当前URL: {current_url}")
+                        self.save_session()
                         return True
                     else:
                         raise Exception("登录后未跳转到正确页面")
@@ -629,49 +3125,76 @@ class LeaflowAutoCheckin:
                 
                 if attempt < max_retries - 1:
                     logger.info(f"正在进行第 {attempt + 2} 次重试...")
-                    self.driver.refresh()
-                    time.sleep(5)
+                    RATE_LIMITER.backoff(BASE_URL, attempt + 1)
                     continue
                 else:
                     raise Exception(f"登录失败，已尝试 {max_retries} 次: {e}")
         
         return False
     
-    def get_balance(self):
-        """获取当前账号的总余额"""
+    BALANCE_SELECTORS = [
+        "//div[contains(@class, 'flex') and contains(., '余额')]//span",
+        "//*[contains(@class, 'balance')]",
+        "//*[contains(text(), '¥') or contains(text(), '￥') or contains(text(), '元')]",
+        "//button[contains(., '余额')]//span",
+        "//span[contains(@class, 'font-medium')]"
+    ]
+    # 非控制台页面上只信任带“余额”标识的元素，避免把套餐价格当成余额
+    LABELLED_BALANCE_SELECTORS = [
+        "//div[contains(@class, 'flex') and contains(., '余额')]//span",
+        "//*[contains(@class, 'balance')]",
+        "//button[contains(., '余额')]//span"
+    ]
+
+    def _read_balance_from_page(self, selectors):
+        """从当前已加载的页面解析余额（不导航），返回数值或 None"""
+        cached = LOCATORS.get('balance', selectors)
+        selectors = LOCATORS.order('balance', selectors)
+        snapshot = self.take_snapshot(selectors)
+        for selector in selectors:
+            for item in snapshot.elements(selector):
+                text = item['text']
+                if any(char.isdigit() for char in text) and ('¥' in text or '￥' in text or '元' in text):
+                    # 提取数字，支持带逗号的千分位
+                    clean_text = text.replace(',', '')
+                    numbers = re.findall(r'\d+\.?\d*', clean_text)
+                    if numbers:
+                        LOCATORS.record('balance', selector, cached)
+                        return numbers[0]
+        return None
+
+    @timed_phase('get_balance')
+    def get_balance(self, refresh=False):
+        """获取当前账号的总余额
+
+        优先返回已缓存的余额，其次解析当前页面，只有都拿不到时才加载控制台；
+        refresh=True 时强制重新加载控制台。
+        """
+        if not refresh and self.balance.is_valid():
+            return self.balance.text
         try:
             logger.info("获取账号余额...")
+
+            if not refresh:
+                current_url = self.driver.current_url or ""
+                selectors = self.BALANCE_SELECTORS if "/dashboard" in current_url else self.LABELLED_BALANCE_SELECTORS
+                balance = self._read_balance_from_page(selectors)
+                if balance:
+                    logger.info(f"从当前页面读取到余额: {balance}元")
+                    self.balance.update(balance, current_url)
+                    return self.balance.text
             
-            self.driver.get("https://leaflow.net/dashboard")
-            time.sleep(3)
+            self._navigate(f"{BASE_URL}/dashboard")
             
             WebDriverWait(self.driver, 10).until(
                 EC.presence_of_element_located((By.TAG_NAME, "body"))
             )
-            
-            balance_selectors = [
-                "//div[contains(@class, 'flex') and contains(., '余额')]//span",
-                "//*[contains(@class, 'balance')]",
-                "//*[contains(text(), '¥') or contains(text(), '￥') or contains(text(), '元')]",
-                "//button[contains(., '余额')]//span",
-                "//span[contains(@class, 'font-medium')]"
-            ]
-            
-            for selector in balance_selectors:
-                try:
-                    elements = self.driver.find_elements(By.XPATH, selector)
-                    for element in elements:
-                        text = element.text.strip()
-                        if any(char.isdigit() for char in text) and ('¥' in text or '￥' in text or '元' in text):
-                            # 提取数字，支持带逗号的千分位
-                            clean_text = text.replace(',', '')
-                            numbers = re.findall(r'\d+\.?\d*', clean_text)
-                            if numbers:
-                                balance = numbers[0]
-                                logger.info(f"找到余额: {balance}元")
-                                return f"{balance}元"
-                except:
-                    continue
+            # 余额由前端异步渲染：直接轮询余额元素，解析出数值即返回
+            balance = self._wait_until(lambda: self._read_balance_from_page(self.BALANCE_SELECTORS), timeout=3)
+            if balance:
+                logger.info(f"找到余额: {balance}元")
+                self.balance.update(balance, f"{BASE_URL}/dashboard")
+                return self.balance.text
             
             logger.warning("未找到余额信息")
             return "未知"
@@ -681,38 +3204,28 @@ class LeaflowAutoCheckin:
             return "未知"
     
     def wait_for_checkin_page_loaded(self, max_retries=3, wait_time=20):
-        """等待签到页面完全加载，支持重试"""
+        """等待签到页面加载，任一签到元素出现即返回，wait_time 为每轮等待上限"""
+        checkin_indicators = [
+            "button.checkin-btn",
+            "//button[contains(text(), '立即签到')]",
+            "//button[contains(text(), '已签到')]",
+            "//button[contains(text(), '已完成')]",
+            "//*[contains(text(), '今日已签到')]",
+            "//*[contains(text(), '每日签到')]",
+            "//*[contains(text(), '签到')]"
+        ]
+
+        def _indicator_visible():
+            selector, _ = self.take_snapshot(checkin_indicators).first(checkin_indicators)
+            return selector is not None
+
         for attempt in range(max_retries):
-            logger.info(f"等待签到页面加载，尝试 {attempt + 1}/{max_retries}，等待 {wait_time} 秒...")
-            time.sleep(wait_time)
+            logger.info(f"等待签到页面加载，尝试 {attempt + 1}/{max_retries}，最多等待 {wait_time} 秒...")
             
             try:
-                checkin_indicators = [
-                    "button.checkin-btn",
-                    "//button[contains(text(), '立即签到')]",
-                    "//button[contains(text(), '已签到')]",
-                    "//button[contains(text(), '已完成')]",
-                    "//*[contains(text(), '今日已签到')]",
-                    "//*[contains(text(), '每日签到')]",
-                    "//*[contains(text(), '签到')]"
-                ]
-                
-                for indicator in checkin_indicators:
-                    try:
-                        if indicator.startswith("//"):
-                            element = WebDriverWait(self.driver, 10).until(
-                                EC.presence_of_element_located((By.XPATH, indicator))
-                            )
-                        else:
-                            element = WebDriverWait(self.driver, 10).until(
-                                EC.presence_of_element_located((By.CSS_SELECTOR, indicator))
-                            )
-                        
-                        if element.is_displayed():
-                            logger.info(f"找到签到页面元素")
-                            return True
-                    except:
-                        continue
+                if self._wait_until(_indicator_visible, timeout=wait_time, poll=0.5):
+                    logger.info(f"找到签到页面元素")
+                    return True
                 
                 logger.warning(f"第 {attempt + 1} 次尝试未找到签到按钮，继续等待...")
                 
@@ -721,251 +3234,46 @@ class LeaflowAutoCheckin:
         
         return False
     
+    @timed_phase('find_and_click_checkin_button')
     def find_and_click_checkin_button(self):
         """查找并点击签到按钮 - 处理已签到状态"""
         logger.info("正在查找并点击'立即签到'按钮...")
         
         try:
-            time.sleep(2)
+            self._wait_for_dom_stable(quiet_ms=300, timeout=2)
 
             # 0. 优先检查是否已经签到（检查文本"今日已签到"或"已完成"按钮）
-            try:
-                success_indicators = [
-                    "//*[contains(text(), '今日已签到')]",
-                    "//button[contains(., '已完成')]",
-                    "//div[contains(., '已完成')]"
-                ]
-                for indicator in success_indicators:
-                    elements = self.driver.find_elements(By.XPATH, indicator)
-                    for el in elements:
-                        if el.is_displayed():
-                            logger.info(f"检测到已签到状态 (Indicator: {indicator})")
-                            return "already_checked_in"
-            except:
-                pass
-            
-            # 尝试处理 iframe 情况
-            iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
-            if iframes:
-                logger.info(f"检测到 {len(iframes)} 个 iframe，尝试在 iframe 中查找按钮")
-                
-                # 临时降低超时时间，防止在某些 iframe 上卡住太久
-                original_timeout = 60
-                try:
-                    self.driver.set_page_load_timeout(10)
-                except:
-                    pass
-
-                for i, frame in enumerate(iframes):
-                    try:
-                        self.driver.switch_to.frame(frame)
-                        logger.info(f"已切换到第 {i+1} 个 iframe")
-                        # 在 iframe 中尝试物理点击 + JS 混合模式
-                        logger.info("尝试在 iframe 中定位'立即签到'按钮...")
-                        try:
-                            # 1. 尝试 JS 智能定位
-                            script = """
-                            const texts = ['立即签到', '签到'];
-                            const checked_texts = ['已签到', '已完成', '今日已签到'];
-                            const nodes = document.querySelectorAll('button, div[role="button"], a[role="button"], .ant-btn');
-                            
-                            for (const el of nodes) {
-                                const text = (el.innerText || '').trim();
-                                if (checked_texts.some(t => text.includes(t))) return 'ALREADY_CHECKED_IN';
-                                if (texts.some(t => text.includes(t))) return el;
-                            }
-                            return null;
-                            """
-                            btn = self.driver.execute_script(script)
-                            
-                            if btn == 'ALREADY_CHECKED_IN':
-                                logger.info("在 iframe 内部检测到已签到状态")
-                                self.driver.switch_to.default_content()
-                                return "already_checked_in"
-
-                            if btn:
-                                logger.info("在 iframe 内部找到按钮，开始物理轰炸...")
-                                # 执行 ActionChains 物理点击
-                                actions = ActionChains(self.driver)
-                                actions.move_to_element(btn).click().perform()
-                                time.sleep(0.5)
-                                # 补一个 JS 点击
-                                self.driver.execute_script("arguments[0].click();", btn)
-                                logger.info("iframe 内部物理+JS点击指令已发出")
-                                self.driver.switch_to.default_content()
-                                return True
-                        except Exception as fe:
-                            logger.warning(f"iframe 内部点击尝试失败: {fe}")
-                        
-                        self.driver.switch_to.default_content()
-                    except Exception as e:
-                        logger.warning(f"处理 iframe {i+1} 时出错: {e}")
-                        self.driver.switch_to.default_content()
-
-                # 恢复默认超时
-                try:
-                    self.driver.set_page_load_timeout(original_timeout)
-                except:
-                    pass
-
-            priority_selectors = [
-                "//button[contains(., '立即签到')]",
-                "//div[@role='button' and contains(., '立即签到')]",
-                "//*[contains(@class, 'ant-btn') and contains(., '立即签到')]",
-                "//*[contains(text(), '立即签到')]",
+            success_indicators = [
+                "//*[contains(text(), '今日已签到')]",
+                "//button[contains(., '已完成')]",
+                "//div[contains(., '已完成')]"
             ]
-            
-            secondary_selectors = [
-                "button.checkin-btn",
-                "//button[contains(., '签到')]",
-                "//*[contains(@class, 'ant-btn') and contains(., '签到')]",
-                "//*[contains(@class, 'el-button') and contains(., '签到')]",
-                "//*[contains(@class, 'MuiButton') and contains(., '签到')]",
-                "//div[@role='button' and contains(., '签到')]",
-                "//a[@role='button' and contains(., '签到')]",
-                "//*[text()='签到']"
-            ]
-            
-            checkin_selectors = priority_selectors + secondary_selectors
-            
-            for selector in checkin_selectors:
-                try:
-                    if selector.startswith("//"):
-                        elements = self.driver.find_elements(By.XPATH, selector)
-                    else:
-                        elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                    
-                    for checkin_btn in elements:
-                        if checkin_btn.is_displayed() and checkin_btn.is_enabled():
-                            btn_text = checkin_btn.text.strip()
-                            try:
-                                btn_html = checkin_btn.get_attribute('outerHTML')
-                                if len(btn_html) > 100:
-                                    btn_html = btn_html[:100] + "..."
-                            except:
-                                btn_html = "N/A"
-                                
-                            if "已签到" in btn_text or "已完成" in btn_text:
-                                logger.info(f"检测到按钮文本包含'已签到' ({btn_text})，跳过点击")
-                                return "already_checked_in"
-                            
-                            if "试用" in btn_text:
-                                logger.info(f"跳过疑似菜单项: {btn_text}")
-                                continue
-
-                            logger.info(f"找到签到按钮 (Text: {btn_text}, Selector: {selector})，尝试点击...")
-                            
-                            try:
-                                self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", checkin_btn)
-                                time.sleep(1)
-                            except:
-                                pass
-                            
-                            # 点击前截图
-                            self.driver.save_screenshot("before_click.png")
-                            logger.info("已保存点击前截图: before_click.png")
+            snapshot = self.take_snapshot(success_indicators)
+            indicator, _ = snapshot.first(success_indicators)
+            if indicator:
+                logger.info(f"检测到已签到状态 (Indicator: {indicator})")
+                return "already_checked_in"
 
-                            try:
-                                # 获取元素位置和大小
-                                location = checkin_btn.location
-                                size = checkin_btn.size
-                                logger.info(f"按钮物理位置: {location}, 大小: {size}")
-                                
-                                # 方案 A: 物理中心点点击
-                                actions = ActionChains(self.driver)
-                                actions.move_to_element(checkin_btn).click().perform()
-                                logger.info("已执行中心点物理模拟点击")
-                                time.sleep(1)
-                                
-                                # 方案 B: 多点偏移轰炸 (针对可能的遮挡或特殊监听)
-                                offsets = [(0, 0), (5, 5), (-5, -5), (10, 0), (0, 10)]
-                                for ox, oy in offsets:
-                                    try:
-                                        actions = ActionChains(self.driver)
-                                        actions.move_to_element_with_offset(checkin_btn, ox, oy).click().perform()
-                                        logger.info(f"已执行偏移点击: ({ox}, {oy})")
-                                        time.sleep(0.5)
-                                    except:
-                                        continue
-                                        
-                                # 方案 C: 强制 JS 派发事件
-                                self.driver.execute_script("""
-                                    var el = arguments[0];
-                                    ['mousedown', 'mouseup', 'click'].forEach(type => {
-                                        var ev = new MouseEvent(type, {
-                                            view: window,
-                                            bubbles: true,
-                                            cancelable: true,
-                                            buttons: 1
-                                        });
-                                        el.dispatchEvent(ev);
-                                    });
-                                """, checkin_btn)
-                                logger.info("已执行全套 JS 事件派发")
-                                
-                            except Exception as e:
-                                logger.warning(f"综合点击尝试出错: {e}")
-                                try:
-                                    self.driver.execute_script("arguments[0].click();", checkin_btn)
-                                except:
-                                    pass
-                            
-                            # 点击瞬间截图
-                            time.sleep(0.5)
-                            self.driver.save_screenshot("after_click_instant.png")
-                            logger.info("已保存点击瞬间截图: after_click_instant.png")
-
-                             # 验证点击结果 - 增加循环检查奖励弹窗
-                            logger.info("循环检查奖励领取弹窗...")
-                            for _ in range(5):
-                                reward_btn_texts = ["领取", "确定", "我知道了", "收下", "Confirm", "OK"]
-                                if self._js_click_by_text(reward_btn_texts, timeout=2):
-                                    logger.info("成功点击奖励领取/确认按钮")
-                                    break
-                                time.sleep(1)
-                            
-                            time.sleep(2)
-                            
-                            # 尝试处理可能出现的“领取”或“确定”按钮
-                            logger.info("检查是否有奖励领取弹窗...")
-                            reward_btn_texts = ["领取", "确定", "我知道了", "收下", "Confirm", "OK"]
-                            if self._js_click_by_text(reward_btn_texts, timeout=5):
-                                logger.info("已点击奖励领取/确认按钮")
-                                time.sleep(2)
-                            
-                            try:
-                                if not checkin_btn.is_displayed():
-                                    logger.info("点击后签到按钮消失，判定为点击成功")
-                                    return True
-                                
-                                new_text = checkin_btn.text.strip()
-                                if new_text != btn_text or "已" in new_text or "完成" in new_text:
-                                    logger.info(f"点击后按钮文本变为: {new_text}，判定为点击成功")
-                                    return True
-                                if not checkin_btn.is_enabled():
-                                    logger.info("点击后按钮已禁用，判定为点击成功")
-                                    return True
-                            except Exception:
-                                logger.info("点击后元素状态改变，判定为点击成功")
-                                return True
-                                
-                            logger.warning("点击后未检测到按钮状态变化，判定点击未生效")
-                            continue
-                except Exception as e:
-                    # 捕获异常并继续，防止因单个 iframe 错误导致整个循环中断
-                    # logger.debug(f"遍历 iframe 时忽略异常: {e}")
-                    continue
+            # 此后的点击结果只认标记之后出现的节点
+            self._mark_page_changes()
             
-            # 恢复默认超时
-            try:
-                self.driver.set_page_load_timeout(original_timeout)
-            except:
-                pass
+            # 按该账号以往成功的路径决定先尝试 iframe 还是主文档
+            for frame in self._ordered_paths('frames', ['iframe', 'main']):
+                if frame == 'iframe':
+                    if not snapshot.iframe_count:
+                        continue
+                    result = self._click_checkin_in_iframes()
+                else:
+                    result = self._click_checkin_in_document()
+                if result:
+                    self.click_path['frame'] = frame
+                    return result
 
             logger.info("常规选择器未找到，尝试 JS 智能搜索点击...")
             js_fallback_texts = ["立即签到", "签到"]
             if self._js_click_by_text(js_fallback_texts, timeout=8):
                 logger.info("JS 点击成功")
+                self.click_path['frame'] = 'js'
                 return True
 
             logger.error("在当前页面/弹窗中找不到可点击的签到按钮")
@@ -975,104 +3283,333 @@ class LeaflowAutoCheckin:
             logger.error(f"查找签到按钮时出错: {e}")
             return False
     
-    def _get_balance_value(self):
+    def _click_checkin_in_iframes(self):
+        """在 iframe 中查找并点击签到按钮，返回 True / "already_checked_in" / False"""
+        iframes = self.driver.find_elements(By.TAG_NAME, "iframe")
+        logger.info(f"检测到 {len(iframes)} 个 iframe，尝试在 iframe 中查找按钮")
+
+        # 临时降低超时时间，防止在某些 iframe 上卡住太久
+        original_timeout = 60
+        try:
+            self.driver.set_page_load_timeout(10)
+        except:
+            pass
+
+        try:
+
+            for i, frame in enumerate(iframes):
+                try:
+                    self.driver.switch_to.frame(frame)
+                    logger.info(f"已切换到第 {i+1} 个 iframe")
+                    # 在 iframe 中尝试物理点击 + JS 混合模式
+                    logger.info("尝试在 iframe 中定位'立即签到'按钮...")
+                    try:
+                        # 1. 尝试 JS 智能定位
+                        script = """
+                        const texts = ['立即签到', '签到'];
+                        const checked_texts = ['已签到', '已完成', '今日已签到'];
+                        const nodes = document.querySelectorAll('button, div[role="button"], a[role="button"], .ant-btn');
+
+                        for (const el of nodes) {
+                            const text = (el.innerText || '').trim();
+                            if (checked_texts.some(t => text.includes(t))) return 'ALREADY_CHECKED_IN';
+                            if (texts.some(t => text.includes(t))) return el;
+                        }
+                        return null;
+                        """
+                        btn = self.driver.execute_script(script)
+
+                        if btn == 'ALREADY_CHECKED_IN':
+                            logger.info("在 iframe 内部检测到已签到状态")
+                            self.driver.switch_to.default_content()
+                            return "already_checked_in"
+
+                        if btn:
+                            logger.info("在 iframe 内部找到按钮，开始物理轰炸...")
+                            # 执行 ActionChains 物理点击
+                            actions = ActionChains(self.driver)
+                            actions.move_to_element(btn).click().perform()
+                            time.sleep(0.5)
+                            # 补一个 JS 点击
+                            self.driver.execute_script("arguments[0].click();", btn)
+                            logger.info("iframe 内部物理+JS点击指令已发出")
+                            self.driver.switch_to.default_content()
+                            return True
+                    except Exception as fe:
+                        logger.warning(f"iframe 内部点击尝试失败: {fe}")
+
+                    self.driver.switch_to.default_content()
+                except Exception as e:
+                    logger.warning(f"处理 iframe {i+1} 时出错: {e}")
+                    self.driver.switch_to.default_content()
+        finally:
+            # 恢复默认超时
+            try:
+                self.driver.set_page_load_timeout(original_timeout)
+            except:
+                pass
+        return False
+
+    def _click_checkin_in_document(self):
+        """在当前文档中按选择器查找并点击签到按钮，返回 True / "already_checked_in" / False"""
+        priority_selectors = [
+            "//button[contains(., '立即签到')]",
+            "//div[@role='button' and contains(., '立即签到')]",
+            "//*[contains(@class, 'ant-btn') and contains(., '立即签到')]",
+            "//*[contains(text(), '立即签到')]",
+        ]
+
+        secondary_selectors = [
+            "button.checkin-btn",
+            "//button[contains(., '签到')]",
+            "//*[contains(@class, 'ant-btn') and contains(., '签到')]",
+            "//*[contains(@class, 'el-button') and contains(., '签到')]",
+            "//*[contains(@class, 'MuiButton') and contains(., '签到')]",
+            "//div[@role='button' and contains(., '签到')]",
+            "//a[@role='button' and contains(., '签到')]",
+            "//*[text()='签到']"
+        ]
+
+        defaults = priority_selectors + secondary_selectors
+        cached = LOCATORS.get('checkin_button', defaults)
+        checkin_selectors = self._ordered_paths('selectors', LOCATORS.order('checkin_button', defaults))
+        result = self._click_checkin_candidates(checkin_selectors)
+        if result is True:
+            LOCATORS.record('checkin_button', self.click_path.get('selector'), cached)
+        return result
+
+    def _click_checkin_candidates(self, checkin_selectors):
+        """按顺序尝试各选择器匹配到的可见按钮，点击后确认状态变化"""
+        snapshot = self.take_snapshot(checkin_selectors)
+
+        for selector in checkin_selectors:
+            try:
+                for candidate in snapshot.elements(selector, visible=True, enabled=True):
+                    checkin_btn = candidate['el']
+                    btn_text = candidate['text']
+
+                    if "已签到" in btn_text or "已完成" in btn_text:
+                        logger.info(f"检测到按钮文本包含'已签到' ({btn_text})，跳过点击")
+                        return "already_checked_in"
+
+                    if "试用" in btn_text:
+                        logger.info(f"跳过疑似菜单项: {btn_text}")
+                        continue
+
+                    logger.info(f"找到签到按钮 (Text: {btn_text}, Selector: {selector})，尝试点击...")
+                    self.click_path['selector'] = selector
+
+                    try:
+                        self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", checkin_btn)
+                    except:
+                        pass
+
+                    # 点击前截图（仅在配置了过程截图时）
+                    self.capture('before_click')
+
+                    try:
+                        # 获取元素位置和大小
+                        location = checkin_btn.location
+                        size = checkin_btn.size
+                        logger.info(f"按钮物理位置: {location}, 大小: {size}")
+
+                        # 方案 A: 物理中心点点击
+                        actions = ActionChains(self.driver)
+                        actions.move_to_element(checkin_btn).click().perform()
+                        logger.info("已执行中心点物理模拟点击")
+                        time.sleep(1)
+
+                        # 方案 B: 多点偏移轰炸 (针对可能的遮挡或特殊监听)
+                        offsets = [(0, 0), (5, 5), (-5, -5), (10, 0), (0, 10)]
+                        for ox, oy in offsets:
+                            try:
+                                actions = ActionChains(self.driver)
+                                actions.move_to_element_with_offset(checkin_btn, ox, oy).click().perform()
+                                logger.info(f"已执行偏移点击: ({ox}, {oy})")
+                                time.sleep(0.5)
+                            except:
+                                continue
+
+                        # 方案 C: 强制 JS 派发事件
+                        self.driver.execute_script("""
+                            var el = arguments[0];
+                            ['mousedown', 'mouseup', 'click'].forEach(type => {
+                                var ev = new MouseEvent(type, {
+                                    view: window,
+                                    bubbles: true,
+                                    cancelable: true,
+                                    buttons: 1
+                                });
+                                el.dispatchEvent(ev);
+                            });
+                        """, checkin_btn)
+                        logger.info("已执行全套 JS 事件派发")
+
+                    except Exception as e:
+                        logger.warning(f"综合点击尝试出错: {e}")
+                        try:
+                            self.driver.execute_script("arguments[0].click();", checkin_btn)
+                        except:
+                            pass
+
+                    # 点击瞬间截图
+                    time.sleep(0.5)
+                    self.capture('after_click')
+
+                     # 验证点击结果 - 增加循环检查奖励弹窗
+                    logger.info("检查奖励领取弹窗...")
+                    reward_btn_texts = ["领取", "确定", "我知道了", "收下", "Confirm", "OK"]
+                    if self._js_click_by_text(reward_btn_texts, timeout=8):
+                        logger.info("成功点击奖励领取/确认按钮")
+                    self._wait_for_dom_stable(quiet_ms=500, timeout=2)
+
+                    try:
+                        if not checkin_btn.is_displayed():
+                            logger.info("点击后签到按钮消失，判定为点击成功")
+                            return True
+
+                        new_text = checkin_btn.text.strip()
+                        if new_text != btn_text or "已" in new_text or "完成" in new_text:
+                            logger.info(f"点击后按钮文本变为: {new_text}，判定为点击成功")
+                            return True
+                        if not checkin_btn.is_enabled():
+                            logger.info("点击后按钮已禁用，判定为点击成功")
+                            return True
+                    except Exception:
+                        logger.info("点击后元素状态改变，判定为点击成功")
+                        return True
+
+                    logger.warning("点击后未检测到按钮状态变化，判定点击未生效")
+                    continue
+            except Exception as e:
+                # 捕获异常并继续，防止因单个 iframe 错误导致整个循环中断
+                # logger.debug(f"遍历 iframe 时忽略异常: {e}")
+                continue
+        return False
+
+    def _get_balance_value(self, refresh=False):
         """辅助方法：获取数值型余额"""
+        self.get_balance(refresh=refresh)
+        return self.balance.value if self.balance.is_valid() else None
+
+    def _resolve_checkin_result(self, start_balance):
+        """点击签到后确认结果，必要时通过余额差值计算奖励"""
+        # 签到后余额已变化，缓存不再可信
+        self.balance.invalidate()
+        result_msg = self.get_checkin_result()
+
+        reward = re.search(r'获得了?\s*(\d+\.?\d*)\s*元', result_msg)
+        if reward and start_balance is not None:
+            # 奖励已知时直接推算签到后余额，省去一次控制台加载
+            self.balance.update(start_balance, "start")
+            self.balance.add(reward.group(1))
+
+        # 如果未提取到具体金额，尝试通过余额变化计算
+        if "获得" not in result_msg and start_balance is not None:
+            logger.info("未从弹窗获取到金额，尝试计算余额差值...")
+            # 等待签到请求完成，随后重新加载控制台读取余额
+            self._wait_for_network_idle(idle_ms=500, timeout=3)
+            
+            end_balance = self._get_balance_value(refresh=True)
+            logger.info(f"签到后余额: {end_balance}")
+            
+            if end_balance is not None and end_balance > start_balance:
+                diff = round(end_balance - start_balance, 2)
+                if diff > 0:
+                    return f"签到成功！您获得了 {diff} 元奖励！"
+            else:
+                logger.warning(f"余额未增加: start={start_balance}, end={end_balance}")
+        
+        if result_msg == "未检测到明确结果":
+            return "签到失败：未检测到奖励，且余额未增加"
+
+        return result_msg
+
+    def _ordered_paths(self, category, defaults):
+        """按该账号的历史成功率排列候选路径，探索轮次保持默认顺序"""
+        if not self.strategies or self.explore:
+            return list(defaults)
+        return StrategyStore.order(self.strategy, category, defaults)
+
+    def _record_path(self, plan, ok):
+        """记录本次方案及点击路径的结果"""
+        if not self.strategies:
+            return
+        outcomes = {'plans': {plan: ok}}
+        if self.click_path.get('frame'):
+            outcomes['frames'] = {self.click_path['frame']: ok}
+        if self.click_path.get('selector'):
+            outcomes['selectors'] = {self.click_path['selector']: ok}
+        try:
+            self.strategy = self.strategies.record(self.email, outcomes)
+        except Exception as e:
+            logger.warning(f"记录签到路径失败: {e}")
+
+    def _checkin_via_workspaces(self):
+        logger.info("尝试方案：主站工作空间弹窗签到")
+        if not self.open_checkin_from_workspaces():
+            logger.warning("工作空间弹窗方案失败，尝试备选方案")
+            return False
+        logger.info("成功打开签到弹窗，准备点击'立即签到'...")
+        return self.find_and_click_checkin_button()
+
+    def _checkin_via_url(self, url):
+        logger.info(f"尝试方案：直接访问签到地址 {url}")
         try:
-            balance_str = self.get_balance()
-            if balance_str and balance_str != "未知":
-                import re
-                match = re.search(r'(\d+\.?\d*)', balance_str)
-                if match:
-                    return float(match.group(1))
-        except Exception:
-            pass
-        return None
+            self.safe_get(url, max_retries=1)
+            if self.wait_for_checkin_page_loaded(max_retries=2, wait_time=15):
+                return self.find_and_click_checkin_button()
+        except Exception as e:
+            logger.warning(f"访问 {url} 失败: {e}")
+        return False
 
+    @timed_phase('checkin')
     def checkin(self):
         """执行签到流程"""
         logger.info("开始签到流程...")
         
-        # 记录初始余额
+        # 记录初始余额（登录后通常已在控制台页面，可直接读取）
         start_balance = self._get_balance_value()
         logger.info(f"签到前余额: {start_balance}")
 
-        logger.info("尝试方案1：主站工作空间弹窗签到")
-        if self.open_checkin_from_workspaces():
-            logger.info("成功打开签到弹窗，准备点击'立即签到'...")
-            checkin_result = self.find_and_click_checkin_button()
-            if checkin_result:
-                if checkin_result == "already_checked_in":
-                    return "今日已签到"
-                
-                result_msg = self.get_checkin_result()
-                
-                # 如果未提取到具体金额，尝试通过余额变化计算
-                if "获得" not in result_msg and start_balance is not None:
-                    # 等待余额更新
-                    logger.info("未从弹窗获取到金额，尝试计算余额差值...")
-                    time.sleep(3)
-                    self.driver.refresh() # 刷新页面以确保余额更新
-                    time.sleep(5)
-                    
-                    end_balance = self._get_balance_value()
-                    logger.info(f"签到后余额: {end_balance}")
-                    
-                    if end_balance is not None and end_balance > start_balance:
-                        diff = round(end_balance - start_balance, 2)
-                        if diff > 0:
-                            return f"签到成功！您获得了 {diff} 元奖励！"
-                    else:
-                        logger.warning(f"余额未增加: start={start_balance}, end={end_balance}")
-                
-                if result_msg == "未检测到明确结果":
-                    return "签到失败：未检测到奖励，且余额未增加"
-
-                return result_msg
-        else:
-            logger.warning("方案1失败，尝试备选方案")
+        if self.strategies:
+            self.strategy = self.strategies.load(self.email)
+            self.explore = bool(self.strategy) and self.strategies.explore()
+        plans = ['workspaces'] + [f"url:{url}" for url in self.checkin_urls]
+        plans = self._ordered_paths('plans', plans)
+        if self.explore:
+            logger.info("本次按默认顺序尝试签到路径（探索）")
+        elif plans[0] != 'workspaces':
+            logger.info(f"按历史记录优先尝试: {plans[0]}")
 
-        logger.info("尝试方案2：直接访问签到 URL")
-        for url in self.checkin_urls:
-            try:
-                logger.info(f"正在访问签到地址: {url}")
-                self.safe_get(url, max_retries=1, wait_between=3)
-                
-                if self.wait_for_checkin_page_loaded(max_retries=2, wait_time=15):
-                    checkin_result = self.find_and_click_checkin_button()
-                    if checkin_result:
-                        if checkin_result == "already_checked_in":
-                            return "今日已签到"
-                        
-                        result_msg = self.get_checkin_result()
-                        
-                        if "获得" not in result_msg and start_balance is not None:
-                             logger.info("未从弹窗获取到金额，尝试计算余额差值...")
-                             time.sleep(3)
-                             self.driver.refresh()
-                             time.sleep(5)
-                             end_balance = self._get_balance_value()
-                             logger.info(f"签到后余额: {end_balance}")
-                             if end_balance is not None and end_balance > start_balance:
-                                 diff = round(end_balance - start_balance, 2)
-                                 if diff > 0:
-                                     return f"签到成功！您获得了 {diff} 元奖励！"
-                             else:
-                                logger.warning(f"余额未增加: start={start_balance}, end={end_balance}")
-                        
-                        if result_msg == "未检测到明确结果":
-                            return "签到失败：未检测到奖励，且余额未增加"
+        for plan in plans:
+            self.click_path = {}
+            if plan == 'workspaces':
+                if not ENDPOINTS.is_alive(f"{BASE_URL}/workspaces"):
+                    logger.warning("工作空间页面探测不可用，跳过该方案")
+                    continue
+                checkin_result = self._checkin_via_workspaces()
+            else:
+                checkin_result = self._checkin_via_url(plan[len('url:'):])
 
-                        return result_msg
-            except Exception as e:
-                logger.warning(f"访问 {url} 失败: {e}")
+            if not checkin_result:
+                self._record_path(plan, False)
                 continue
+            if checkin_result == "already_checked_in":
+                self._record_path(plan, True)
+                return "今日已签到"
+            result = self._resolve_checkin_result(start_balance)
+            self._record_path(plan, _is_confirmed_result(True, result))
+            return result
         
         raise Exception("所有签到方案均失败")
     
+    @timed_phase('get_checkin_result')
     def get_checkin_result(self):
         """获取签到结果消息"""
         try:
-            time.sleep(3)
+            # 点击后新出现的提示节点即开始解析，最多等待 3 秒
+            self._wait_for_new_result(['获得', '成功', '已签到', '元'], timeout=3)
             
             # 优先查找明确的成功提示元素
             success_selectors = [
@@ -1083,83 +3620,80 @@ class LeaflowAutoCheckin:
                 "//div[contains(@class, 'el-message__content')]"
             ]
             
-            for selector in success_selectors:
-                try:
-                    if selector.startswith("//"):
-                        elements = self.driver.find_elements(By.XPATH, selector)
-                    else:
-                        elements = self.driver.find_elements(By.CSS_SELECTOR, selector)
-                        
-                    for element in elements:
-                        if element.is_displayed():
-                            text = element.text.strip()
-                            # 尝试从提示文本中提取金额
-                            match = re.search(r'获得\s*(\d+\.?\d*)\s*元', text) or \
-                                    re.search(r'\+\s*(\d+\.?\d*)\s*元', text) or \
-                                    re.search(r'(\d+\.?\d*)\s*元', text)
-                            
-                            if match and ("签到" in text or "成功" in text or "获得" in text):
-                                return f"签到成功！您获得了 {match.group(1)} 元奖励！"
-                            
-                            if text and ("签到" in text or "成功" in text) and len(text) > 4: 
-                                return text
-                except:
-                    continue
-            
-            # 如果没找到弹窗，扫描全页面文本
-            page_text = self.driver.find_element(By.TAG_NAME, "body").text
-            
-            # 1. 匹配标准奖励格式
-            match = re.search(r'获得\s*(\d+\.?\d*)\s*元', page_text) or \
-                    re.search(r'\+\s*(\d+\.?\d*)\s*元', page_text)
-            if match:
-                return f"签到成功！您获得了 {match.group(1)} 元奖励！"
-            
-            # 2. 匹配签到记录行
-            date_pattern = datetime.now().strftime("%Y-%m-%d")
-            lines = page_text.split('\n')
-            for line in lines:
-                line = line.strip()
-                if date_pattern in line and ("+" in line or "元" in line):
-                     match = re.search(r'(\d+\.?\d*)\s*元', line) or re.search(r'\+\s*(\d+\.?\d*)', line)
-                     if match:
-                         return f"签到成功！您获得了 {match.group(1)} 元奖励！"
-                     return f"签到成功！({line})"
-
-            # 3. 检查按钮状态
-            try:
-                checkin_btn = None
-                btn_selectors = ["button.checkin-btn", "//button[contains(., '已签到')]"]
-                for sel in btn_selectors:
-                    try:
-                        if sel.startswith("//"):
-                            els = self.driver.find_elements(By.XPATH, sel)
-                        else:
-                            els = self.driver.find_elements(By.CSS_SELECTOR, sel)
-                        if els:
-                            checkin_btn = els[0]
-                            break
-                    except: pass
-                
-                if checkin_btn:
-                    if not checkin_btn.is_enabled() or "已签到" in checkin_btn.text:
-                        return "签到成功！(已签到)"
-            except:
-                pass
+            btn_selectors = ["button.checkin-btn", "//button[contains(., '已签到')]"]
+            # 提示元素、按钮状态和全页面文本在一次快照中获取
+            snapshot = self.take_snapshot(success_selectors + btn_selectors, include_body=True, text_limit=2000)
             
-            return "未检测到明确结果"
+            messages = [element['text'] for selector in success_selectors
+                        for element in snapshot.elements(selector, visible=True)]
+            _, checkin_btn = snapshot.first(btn_selectors, visible=None)
+            result = CheckinResultExtractor.extract(messages, snapshot.body_text, checkin_btn)
+            logger.info(f"结果解析: {result.status} (来源: {result.source}, 置信度: {result.confidence})")
+            return result.message
             
         except Exception as e:
             return f"获取结果出错: {str(e)}"
     
+    def cached_cookies(self):
+        """HTTP 快速路径可用的 Cookie：优先本地会话缓存，其次 LEAFLOW_COOKIE"""
+        cookies = self.session_store.load(self.email) if self.session_store else None
+        return cookies or os.getenv('LEAFLOW_COOKIE')
+
+    def capture(self, name, failure=False):
+        ARTIFACTS.capture(self.driver, self.report_label, self.attempt, name, failure, self.capture_steps)
+
+    def save_error_snapshot(self):
+        """发生异常时保存现场截图"""
+        self.capture('error', failure=True)
+
+    def abort_driver(self):
+        """强制关闭浏览器（用于超时/取消），使阻塞中的驱动调用尽快抛出异常"""
+        self._driver_broken = True
+        self.release_driver()
+
+    @timed_phase('http_checkin')
+    def run_http(self, cookies):
+        """纯 HTTP 快速路径，无法确认签到结果时返回 None"""
+        client = LeaflowHttpClient(cookies, checkin_urls=self.checkin_urls)
+        try:
+            result = client.checkin()
+            if not result:
+                return None
+            balance = client.get_balance() or "未知"
+            logger.info(f"[HTTP] 签到结果: {result}, 余额: {balance}")
+            return True, result, balance
+        except Exception as e:
+            logger.warning(f"[HTTP] 快速路径出错，回退到浏览器流程: {e}")
+            return None
+        finally:
+            client.close()
+
     def run(self):
         """单个账号执行流程"""
         try:
             logger.info(f"开始处理账号")
+
+            cookies = self.cached_cookies()
+            if self.http_mode and cookies:
+                fast_result = self.run_http(cookies)
+                if fast_result:
+                    return fast_result
+                logger.info("HTTP 快速路径未能确认结果，使用浏览器流程")
+
+            if not self.driver:
+                self.setup_driver()
             
             if self.login():
+                fast_result = self.run_http(self.driver.get_cookies()) if self.http_mode else None
+                if fast_result:
+                    success, result, balance = fast_result
+                    if balance == "未知":
+                        balance = self.get_balance()
+                    return success, result, balance
+
                 result = self.checkin()
                 balance = self.get_balance()
+                self.save_session()
                 
                 logger.info(f"签到结果: {result}, 余额: {balance}")
                 return True, result, balance
@@ -1168,19 +3702,13 @@ class LeaflowAutoCheckin:
                 
         except Exception as e:
             # 发生异常时，强制截图
-            if self.driver:
-                try:
-                    timestamp = datetime.now().strftime("%H%M%S")
-                    filename = f"error_snapshot_{timestamp}.png"
-                    self.driver.save_screenshot(filename)
-                    logger.info(f"已保存错误现场截图: {filename}")
-                except:
-                    pass
+            self.save_error_snapshot()
 
             error_msg = f"自动签到失败: {str(e)}"
-            if self._is_driver_timeout(str(e)):
+            if self._is_driver_timeout(str(e)) and self.driver:
                 logger.warning("检测到驱动超时，尝试重启驱动并重试一次...")
                 try:
+                    self.attempt += 1
                     self.restart_driver()
                     if self.login():
                         result = self.checkin()
@@ -1194,12 +3722,737 @@ class LeaflowAutoCheckin:
         
         finally:
             if self.driver:
+                self.capture('final_state')
+                self.release_driver()
+
+class PhaseTimeoutError(Exception):
+    """单个阶段超时（与 asyncio.TimeoutError 区分，后者表示整个账号超时）"""
+
+class AsyncOrchestrator:
+    """asyncio 调度器：账号流程、通知与重试作为同一事件循环上的任务运行
+
+    浏览器操作是阻塞调用，放到线程池中执行；每个阶段单独设置超时，
+    超时后强制关闭该账号的浏览器，避免一个慢账号拖住整个任务。
+    """
+
+    DEFAULT_PHASE_TIMEOUTS = {
+        'http_checkin': 30,
+        'driver_startup': 120,
+        'login': 240,
+        'checkin': 300,
+        'get_balance': 90,
+        'send_notification': 60,
+    }
+
+    def __init__(self, manager, concurrency):
+        self.manager = manager
+        self.concurrency = max(1, concurrency)
+        self.phase_timeouts = self._load_phase_timeouts()
+        self.account_timeout = _env_int('LEAFLOW_ACCOUNT_TIMEOUT', 900, minimum=1)
+        self.run_timeout = _env_int('LEAFLOW_RUN_TIMEOUT', 0, minimum=0)
+        self.retries = _env_int('LEAFLOW_ACCOUNT_RETRIES', 1, minimum=0)
+        self.executor = None
+        self.semaphore = None
+
+    def _load_phase_timeouts(self):
+        """LEAFLOW_PHASE_TIMEOUTS 格式: login=120,checkin=180"""
+        timeouts = dict(self.DEFAULT_PHASE_TIMEOUTS)
+        for item in os.getenv('LEAFLOW_PHASE_TIMEOUTS', '').split(','):
+            name, _, value = item.partition('=')
+            if name.strip() and value.strip():
                 try:
-                    # 无论成功失败，最后都保存一张状态截图
-                    self.driver.save_screenshot("final_state.png")
-                except:
-                    pass
-                self.driver.quit()
+                    timeouts[name.strip()] = float(value)
+                except ValueError:
+                    logger.warning(f"忽略无效的阶段超时配置: {item}")
+        return timeouts
+
+    async def _in_executor(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def _phase(self, bot, name, func, *args):
+        timeout = self.phase_timeouts.get(name)
+        try:
+            return await asyncio.wait_for(self._in_executor(func, *args), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"[{_mask_email(bot.email)}] 阶段 {name} 超过 {timeout} 秒，强制关闭浏览器")
+            # 阻塞中的线程无法被取消，关闭浏览器使其尽快退出
+            asyncio.get_running_loop().run_in_executor(self.executor, bot.abort_driver)
+            raise PhaseTimeoutError(f"阶段 {name} 超时（{timeout}s）")
+
+    async def _account_flow(self, bot):
+        cookies = bot.cached_cookies()
+        if bot.http_mode and cookies:
+            fast_result = await self._phase(bot, 'http_checkin', bot.run_http, cookies)
+            if fast_result:
+                return fast_result
+
+        await self._phase(bot, 'driver_startup', bot.setup_driver)
+        if not await self._phase(bot, 'login', bot.login):
+            raise Exception("登录失败")
+
+        if bot.http_mode:
+            fast_result = await self._phase(bot, 'http_checkin', bot.run_http, bot.driver.get_cookies())
+            if fast_result:
+                success, result, balance = fast_result
+                if balance == "未知":
+                    balance = await self._phase(bot, 'get_balance', bot.get_balance)
+                return success, result, balance
+
+        result = await self._phase(bot, 'checkin', bot.checkin)
+        balance = await self._phase(bot, 'get_balance', bot.get_balance)
+        await self._in_executor(bot.save_session)
+        logger.info(f"签到结果: {result}, 余额: {balance}")
+        return True, result, balance
+
+    async def _run_account(self, index, account):
+        email = account['email']
+        start = time.perf_counter()
+        outcome = (False, "自动签到失败: 未执行", "未知")
+        try:
+            for attempt in range(1, self.retries + 2):
+                async with self.semaphore:
+                    outcome = await self._run_attempt(index, account, attempt)
+                if outcome[0]:
+                    break
+                if attempt <= self.retries:
+                    # 重试前释放并发名额，不占用其它账号的执行机会
+                    delay = RATE_LIMITER.backoff_delay(BASE_URL, attempt)
+                    logger.warning(f"{outcome[1]}，{delay:.1f} 秒后进行第 {attempt + 1} 次尝试")
+                    await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            # 无论取消发生在执行中还是重试等待中，都记录一次最终结果
+            outcome = (False, "自动签到失败: 任务已取消", "未知")
+            self.manager.finish_account(email, *outcome, time.perf_counter() - start)
+            raise
+
+        # 只记录最终结果，被重试的失败尝试不写检查点、不推送
+        self.manager.finish_account(email, *outcome, time.perf_counter() - start)
+        if not outcome[0]:
+            logger.error(outcome[1])
+        return (email, *outcome)
+
+    async def _run_attempt(self, index, account, attempt):
+        email = account['email']
+        logger.info(f"处理第 {index}/{len(self.manager.pending_accounts)} 个账号: {_mask_email(email)}（第 {attempt} 次）")
+        bot = None
+        outcome = (False, "自动签到失败: 未执行", "未知")
+        aborted = False
+        try:
+            bot = LeaflowAutoCheckin(email, account['password'], driver_pool=self.manager.driver_pool)
+            bot.attempt = attempt
+            outcome = await asyncio.wait_for(self._account_flow(bot), self.account_timeout)
+        except asyncio.CancelledError:
+            aborted = True
+            raise
+        except asyncio.TimeoutError:
+            aborted = True
+            outcome = (False, f"自动签到失败: 账号处理超过 {self.account_timeout} 秒", "未知")
+        except Exception as e:
+            outcome = (False, f"自动签到失败: {str(e)}", "未知")
+        finally:
+            if bot and aborted:
+                # 执行阶段的线程可能仍在使用该浏览器：标记损坏并丢弃，不截图、不归还驱动池
+                bot._driver_broken = True
+                asyncio.get_running_loop().run_in_executor(self.executor, bot.abort_driver)
+            elif bot and bot.driver:
+                if not outcome[0]:
+                    await self._in_executor(bot.save_error_snapshot)
+                await self._in_executor(bot.release_driver)
+        return outcome
+
+    async def run(self):
+        """运行全部账号并发送通知，返回按账号顺序排列的结果"""
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        # 线程数留有余量：超时被放弃的阻塞调用可能仍占用线程
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency * 2 + 2, thread_name_prefix="async-worker")
+        try:
+            tasks = [
+                asyncio.ensure_future(self._run_account(i, account))
+                for i, account in enumerate(self.manager.pending_accounts, 1)
+            ]
+            done, pending = await asyncio.wait(tasks, timeout=self.run_timeout or None)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"超过总运行时长 {self.run_timeout} 秒，取消 {len(pending)} 个未完成的账号")
+                await asyncio.gather(*pending, return_exceptions=True)
+
+            results = []
+            for task, account in zip(tasks, self.manager.pending_accounts):
+                if task.cancelled() or task.exception():
+                    results.append((account['email'], False, "自动签到失败: 任务已取消", "未知"))
+                else:
+                    results.append(task.result())
+            results = self.manager.merge_results(results)
+
+            try:
+                await asyncio.wait_for(
+                    self._in_executor(self.manager.send_notification, results),
+                    self.phase_timeouts.get('send_notification'),
+                )
+            except asyncio.TimeoutError:
+                logger.error("发送通知超时")
+            return results
+        finally:
+            self.executor.shutdown(wait=False)
+
+def _account_worker_main(account, conn, endpoint_alive=None, proxy_endpoint=None):
+    """子进程入口：独立会话运行单个账号，结果和阶段耗时通过管道传回主进程"""
+    try:
+        # 独立进程组，超限时可连同 chromedriver/Chrome 一起结束
+        os.setsid()
+    except Exception:
+        pass
+    # 入口探测只在主进程进行一次，子进程沿用探测结果
+    ENDPOINTS.alive = dict(endpoint_alive or {})
+    CACHE_PROXY.attach(proxy_endpoint)
+    email = account['email']
+    try:
+        bot = LeaflowAutoCheckin(email, account['password'])
+        success, result, balance = bot.run()
+    except Exception as e:
+        success, result, balance = False, f"处理账号时发生异常: {str(e)}", "未知"
+    ARTIFACTS.flush()
+    try:
+        conn.send({
+            'success': success,
+            'result': result,
+            'balance': balance,
+            'report': RUN_REPORT.to_dict()['accounts'].get(_account_label(email)),
+            'blocking': BLOCK_STATS.summary(),
+            'locators': LOCATORS.stats,
+        })
+    finally:
+        conn.close()
+
+def _child_pids(pid):
+    """通过 /proc 查找进程的所有子孙进程（非 Linux 返回空列表）"""
+    children = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                stat = f.read()
+            # 进程名可能包含空格，ppid 位于右括号之后的第二个字段
+            ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    result = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+def _process_rss_mb(pid):
+    """进程内存（MB）：优先读取 PSS（共享页按进程数分摊），内核不支持 smaps_rollup 时退回 VmRSS"""
+    for path, field in ((f'/proc/{pid}/smaps_rollup', 'Pss:'), (f'/proc/{pid}/status', 'VmRSS:')):
+        try:
+            with open(path, 'r') as f:
+                for line in f:
+                    if line.startswith(field):
+                        return int(line.split()[1]) / 1024
+        except (OSError, ValueError, IndexError):
+            continue
+    return 0.0
+
+def _tree_rss_mb(pid):
+    """工作进程及其 chromedriver/Chrome 子进程的内存总和
+
+    Chrome 各进程大量共享页面，按 PSS 求和不会把共享内存重复计算；
+    退回 VmRSS 时结果会偏高。
+    """
+    return sum(_process_rss_mb(p) for p in [pid] + _child_pids(pid))
+
+def _kill_process_tree(process):
+    pids = _child_pids(process.pid) if process.pid else []
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except Exception:
+        pass
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except Exception:
+            pass
+    process.kill()
+    process.join(5)
+
+class ProcessWorkerPool:
+    """多进程执行模式：每个账号在独立的子进程中运行
+
+    每个子进程限制墙钟时间和内存（PSS，含 Chrome 子进程），超限时结束整个进程组并重试，
+    结果传回 MultiAccountManager。同一时刻最多运行 concurrency 个子进程，内存峰值与账号数无关。
+    """
+
+    def __init__(self, manager, concurrency):
+        self.manager = manager
+        self.concurrency = max(1, concurrency)
+        self.max_rss_mb = _env_int('LEAFLOW_WORKER_MAX_RSS_MB', 1536, minimum=0)
+        self.timeout = _env_int('LEAFLOW_WORKER_TIMEOUT', 600, minimum=1)
+        self.retries = _env_int('LEAFLOW_WORKER_RETRIES', 1, minimum=0)
+        self.context = multiprocessing.get_context('spawn')
+
+    def _start(self, account, attempt):
+        receiver, sender = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=_account_worker_main, args=(account, sender, ENDPOINTS.alive, CACHE_PROXY.endpoint()),
+            name=f"account-{_mask_email(account['email'])}", daemon=True,
+        )
+        process.start()
+        sender.close()
+        logger.info(f"子进程 {process.pid} 开始处理账号 {_mask_email(account['email'])}（第 {attempt} 次）")
+        return {'account': account, 'attempt': attempt, 'process': process, 'conn': receiver,
+                'started': time.monotonic(), 'peak_rss_mb': 0.0}
+
+    def _check(self, worker):
+        """返回 (是否结束, 结果消息或失败原因)"""
+        process, conn = worker['process'], worker['conn']
+        try:
+            if conn.poll():
+                return True, conn.recv()
+        except (EOFError, OSError):
+            return True, "子进程异常退出"
+        if not process.is_alive():
+            # 子进程可能在上次 poll 之后才写入结果并退出，判定崩溃前再读一次
+            try:
+                if conn.poll():
+                    return True, conn.recv()
+            except (EOFError, OSError):
+                pass
+            return True, f"子进程异常退出（退出码 {process.exitcode}）"
+        elapsed = time.monotonic() - worker['started']
+        if elapsed > self.timeout:
+            return True, f"子进程超过 {self.timeout} 秒未完成"
+        if self.max_rss_mb:
+            rss = _tree_rss_mb(process.pid)
+            worker['peak_rss_mb'] = max(worker['peak_rss_mb'], rss)
+            if rss > self.max_rss_mb:
+                return True, f"子进程内存 {rss:.0f} MB 超过上限 {self.max_rss_mb} MB"
+        return False, None
+
+    def _finish(self, worker, message):
+        account, process = worker['account'], worker['process']
+        email = account['email']
+        if isinstance(message, dict):
+            process.join(10)
+            if process.is_alive():
+                _kill_process_tree(process)
+            RUN_REPORT.merge_account(_account_label(email), message.get('report'), worker['attempt'] - 1)
+            BLOCK_STATS.merge(message.get('blocking') or {})
+            LOCATORS.merge(message.get('locators'))
+            outcome = (message['success'], message['result'], message['balance'])
+        else:
+            logger.warning(f"[{_mask_email(email)}] {message}，结束子进程 {process.pid}")
+            _kill_process_tree(process)
+            outcome = (False, f"自动签到失败: {message}", "未知")
+        worker['conn'].close()
+        seconds = time.monotonic() - worker['start_total']
+        RUN_REPORT.record('worker_process', time.monotonic() - worker['started'], outcome[0],
+                          _account_label(email), worker['attempt'])
+        if worker['peak_rss_mb']:
+            logger.info(f"[{_mask_email(email)}] 子进程峰值内存 {worker['peak_rss_mb']:.0f} MB")
+        return outcome, seconds
+
+    def run(self):
+        accounts = self.manager.pending_accounts
+        backlog = [(account, 1, None, 0.0) for account in accounts]
+        results = {}
+        running = []
+        logger.info(f"多进程模式：最多 {self.concurrency} 个子进程，"
+                    f"单进程内存上限 {self.max_rss_mb or '不限'} MB，超时 {self.timeout} 秒")
+        try:
+            while backlog or running:
+                now = time.monotonic()
+                for item in [item for item in backlog if item[3] <= now]:
+                    if len(running) >= self.concurrency:
+                        break
+                    backlog.remove(item)
+                    account, attempt, start_total, _ = item
+                    worker = self._start(account, attempt)
+                    worker['start_total'] = start_total or worker['started']
+                    running.append(worker)
+
+                time.sleep(0.5)
+                for worker in list(running):
+                    done, message = self._check(worker)
+                    if not done:
+                        continue
+                    running.remove(worker)
+                    (success, result, balance), seconds = self._finish(worker, message)
+                    email = worker['account']['email']
+                    if not success and worker['attempt'] <= self.retries:
+                        delay = RATE_LIMITER.backoff_delay(BASE_URL, worker['attempt'])
+                        logger.warning(f"[{_mask_email(email)}] {result}，{delay:.1f} 秒后重试")
+                        backlog.append((worker['account'], worker['attempt'] + 1, worker['start_total'],
+                                        time.monotonic() + delay))
+                        continue
+                    self.manager.finish_account(email, success, result, balance, seconds)
+                    results[email] = (email, success, result, balance)
+        finally:
+            for worker in running:
+                _kill_process_tree(worker['process'])
+        return [results[account['email']] for account in accounts if account['email'] in results]
+
+class RetryAfter(Exception):
+    """通知后端要求在指定秒数后重试（如 Telegram 429）"""
+
+    def __init__(self, delay, message=""):
+        super().__init__(message or f"retry after {delay}s")
+        self.delay = delay
+
+class Notifier:
+    """通知后端基类：send() 成功返回 True，永久失败返回 False，抛出异常则按退避重试
+
+    每个后端有独立的并发上限和投递统计；stream=False 的后端只接收汇总消息。
+    """
+
+    name = "notifier"
+    concurrency = 1
+    stream = True
+    retry_whole_message = True
+
+    def __init__(self, max_retries=None):
+        self.max_retries = max_retries if max_retries is not None else _env_int('LEAFLOW_NOTIFY_RETRIES', 4, minimum=0)
+        self.semaphore = threading.BoundedSemaphore(self.concurrency)
+        self._stats_lock = threading.Lock()
+        self.stats = {'queued': 0, 'delivered': 0, 'failed': 0, 'retries': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+
+    def send(self, message):
+        raise NotImplementedError
+
+    def _with_retries(self, func, *args):
+        for attempt in range(self.max_retries + 1):
+            delay = None
+            try:
+                return func(*args)
+            except RetryAfter as e:
+                delay = e.delay
+                logger.warning(f"[{self.name}] 通知被限流，{delay} 秒后重试")
+            except Exception as e:
+                logger.warning(f"[{self.name}] 发送通知时出错（第 {attempt + 1} 次）: {e}")
+            if attempt < self.max_retries:
+                with self._stats_lock:
+                    self.stats['retries'] += 1
+                time.sleep(min(60.0, float(delay)) if delay else min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0))
+        return False
+
+    def deliver(self, message):
+        start = time.perf_counter()
+        with self.semaphore:
+            ok = bool(self._with_retries(self.send, message) if self.retry_whole_message else self.send(message))
+        seconds = time.perf_counter() - start
+        with self._stats_lock:
+            self.stats['delivered' if ok else 'failed'] += 1
+            self.stats['seconds'] = round(self.stats['seconds'] + seconds, 3)
+            self.stats['max_seconds'] = round(max(self.stats['max_seconds'], seconds), 3)
+        return ok
+
+    def close(self):
+        pass
+
+class HttpNotifier(Notifier):
+    """基于 requests 连接池的通知后端"""
+
+    def __init__(self, max_retries=None):
+        super().__init__(max_retries)
+        self.session = None
+        self._session_lock = threading.Lock()
+
+    def _session(self):
+        with self._session_lock:
+            if self.session is None:
+                _load_requests()
+                self.session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(2, self.concurrency))
+                self.session.mount('https://', adapter)
+                self.session.mount('http://', adapter)
+            return self.session
+
+    def _check_response(self, response):
+        if response.status_code == 429:
+            raise RetryAfter(_retry_after(response) or 5)
+        if response.status_code >= 500:
+            raise Exception(f"HTTP {response.status_code}")
+        if response.status_code >= 400:
+            logger.error(f"[{self.name}] 通知发送失败: {response.status_code} {response.text[:200]}")
+            return False
+        return True
+
+    def close(self):
+        if self.session:
+            self.session.close()
+
+class TelegramNotifier(HttpNotifier):
+    """Telegram：按 4096 字符分段发送 HTML 消息，429 时按 retry_after 等待"""
+
+    name = "telegram"
+    # 分段各自重试，避免整条重试时重复发送已成功的分段
+    retry_whole_message = False
+    MAX_LENGTH = 4096
+
+    def __init__(self, token, chat_id, max_retries=None):
+        super().__init__(max_retries)
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.chat_id = chat_id
+
+    @classmethod
+    def split_message(cls, text, limit=None):
+        """优先在账号段落（空行）处分段，其次按行，最后按长度硬切"""
+        limit = limit or cls.MAX_LENGTH
+        chunks = []
+        current = ""
+        for block in text.split("\n\n"):
+            pieces = [block] if len(block) <= limit else block.split("\n")
+            for piece in pieces:
+                while len(piece) > limit:
+                    if current:
+                        chunks.append(current)
+                        current = ""
+                    chunks.append(piece[:limit])
+                    piece = piece[limit:]
+                separator = "\n\n" if piece is block else "\n"
+                candidate = f"{current}{separator}{piece}" if current else piece
+                if len(candidate) <= limit:
+                    current = candidate
+                else:
+                    chunks.append(current)
+                    current = piece
+        if current.strip():
+            chunks.append(current)
+        return chunks
+
+    def _post(self, data):
+        response = self._session().post(self.url, data=data, timeout=10)
+        if response.status_code == 429:
+            try:
+                retry_after = (response.json().get('parameters') or {}).get('retry_after')
+            except ValueError:
+                retry_after = None
+            raise RetryAfter(retry_after or 5)
+        if response.status_code == 400 and 'parse' in response.text.lower() and 'parse_mode' in data:
+            # HTML 解析失败时改为纯文本重发
+            data.pop('parse_mode')
+            return self._post(data)
+        return self._check_response(response)
+
+    def send(self, message):
+        ok = True
+        for chunk in self.split_message(message['html']):
+            data = {"chat_id": self.chat_id, "text": chunk, "parse_mode": "HTML"}
+            ok = self._with_retries(self._post, data) and ok
+        return ok
+
+class WebhookNotifier(HttpNotifier):
+    """通用 Webhook：POST JSON（kind、text、results）"""
+
+    name = "webhook"
+    concurrency = 2
+
+    def __init__(self, url, max_retries=None):
+        super().__init__(max_retries)
+        self.url = url
+
+    def send(self, message):
+        payload = {key: message[key] for key in ('kind', 'subject', 'text', 'results')}
+        return self._check_response(self._session().post(self.url, json=payload, timeout=10))
+
+class SmtpNotifier(Notifier):
+    """SMTP 邮件：只发送汇总，465 端口使用 SSL，其它端口尝试 STARTTLS
+
+    认证失败、收件人/发件人被拒等 5xx 永久错误直接返回 False，只有连接问题和 4xx 临时错误才重试。
+    """
+
+    name = "smtp"
+    stream = False
+
+    def __init__(self, host, port, username, password, sender, recipients, max_retries=None):
+        super().__init__(max_retries)
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.recipients = recipients
+
+    def send(self, message):
+        import smtplib
+        from email.message import EmailMessage
+
+        mail = EmailMessage()
+        mail['Subject'] = message['subject']
+        mail['From'] = self.sender
+        mail['To'] = ', '.join(self.recipients)
+        mail.set_content(message['text'])
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=15)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=15)
+        try:
+            if self.port != 465:
+                server.ehlo()
+                if server.has_extn('starttls'):
+                    server.starttls()
+                    server.ehlo()
+            if self.username:
+                server.login(self.username, self.password)
+            server.send_message(mail)
+        except smtplib.SMTPRecipientsRefused as e:
+            codes = [code for code, _ in e.recipients.values()]
+            if codes and all(code >= 500 for code in codes):
+                logger.error(f"[{self.name}] 收件人被拒绝，不再重试: {e.recipients}")
+                return False
+            raise
+        except smtplib.SMTPNotSupportedError as e:
+            logger.error(f"[{self.name}] 服务器不支持所需功能，不再重试: {e}")
+            return False
+        except smtplib.SMTPResponseException as e:
+            # 5xx 为永久错误（含 535 认证失败），重试不会成功
+            if e.smtp_code >= 500:
+                logger.error(f"[{self.name}] 发送失败（{e.smtp_code}），不再重试: {e.smtp_error!r}")
+                return False
+            raise
+        finally:
+            try:
+                server.quit()
+            except Exception:
+                pass
+        return True
+
+class FileNotifier(Notifier):
+    """本地文件或标准输出（路径为 -），用于测试和调试"""
+
+    name = "file"
+
+    def __init__(self, path, max_retries=0):
+        super().__init__(max_retries)
+        self.path = path
+
+    def send(self, message):
+        text = f"[{datetime.now().isoformat(timespec='seconds')}] {message['kind']}\n{message['text']}\n\n"
+        if self.path == '-':
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        else:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(text)
+        return True
+
+def load_notifiers():
+    """根据环境变量启用通知后端"""
+    notifiers = []
+    token, chat_id = os.getenv('TELEGRAM_BOT_TOKEN', ''), os.getenv('TELEGRAM_CHAT_ID', '')
+    if token and chat_id:
+        notifiers.append(TelegramNotifier(token, chat_id))
+    webhook_url = os.getenv('LEAFLOW_WEBHOOK_URL', '').strip()
+    if webhook_url:
+        notifiers.append(WebhookNotifier(webhook_url))
+    smtp_host = os.getenv('LEAFLOW_SMTP_HOST', '').strip()
+    smtp_to = [addr.strip() for addr in os.getenv('LEAFLOW_SMTP_TO', '').split(',') if addr.strip()]
+    if smtp_host and smtp_to:
+        notifiers.append(SmtpNotifier(
+            smtp_host, _env_int('LEAFLOW_SMTP_PORT', 465, minimum=1),
+            os.getenv('LEAFLOW_SMTP_USER', ''), os.getenv('LEAFLOW_SMTP_PASSWORD', ''),
+            os.getenv('LEAFLOW_SMTP_FROM', ''), smtp_to,
+        ))
+    notify_file = os.getenv('LEAFLOW_NOTIFY_FILE', '').strip()
+    if notify_file:
+        notifiers.append(FileNotifier(notify_file))
+    return notifiers
+
+class NotificationQueue:
+    """后台投递队列：每个后端有独立的任务队列和守护线程，线程数等于该后端的并发上限
+
+    慢的后端只会积压自己的队列，不会占用其它后端的线程；并发为 1 的后端按发布顺序投递。
+    flush 最多等待指定秒数，尚未开始的任务被丢弃；正在发送的任务再等待 CLOSE_GRACE 秒，
+    后端的线程全部退出后才关闭其会话，否则保留会话随进程退出。
+    """
+
+    CLOSE_GRACE = 10
+
+    def __init__(self, notifiers):
+        self.notifiers = notifiers
+        self.queues = {}
+        self.threads = {}
+        self._pending = 0
+        self._cond = threading.Condition()
+        for notifier in notifiers:
+            jobs = self.queues[notifier] = queue.Queue()
+            self.threads[notifier] = []
+            for i in range(max(1, notifier.concurrency)):
+                thread = threading.Thread(target=self._worker, args=(notifier, jobs),
+                                          name=f"notify_{notifier.name}_{i}", daemon=True)
+                thread.start()
+                self.threads[notifier].append(thread)
+
+    def _worker(self, notifier, jobs):
+        while True:
+            message = jobs.get()
+            if message is None:
+                return
+            try:
+                notifier.deliver(message)
+            except Exception as e:
+                logger.error(f"[{notifier.name}] 通知投递异常: {e}")
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
+
+    def publish(self, message):
+        for notifier in self.notifiers:
+            if message['kind'] != 'summary' and not notifier.stream:
+                continue
+            with self._cond:
+                self._pending += 1
+            with notifier._stats_lock:
+                notifier.stats['queued'] += 1
+            self.queues[notifier].put(message)
+
+    def flush(self, timeout):
+        """等待队列清空；返回是否在超时前全部投递成功"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"通知未能在 {timeout} 秒内全部发送，放弃剩余 {self._pending} 条")
+                    break
+                self._cond.wait(remaining)
+            drained = not self._pending
+        self._stop_workers()
+        return drained and not any(notifier.stats['failed'] for notifier in self.notifiers)
+
+    def _stop_workers(self):
+        """丢弃未开始的任务并让线程退出；仍在发送的后端不关闭会话，避免在使用中被关闭"""
+        for notifier, jobs in self.queues.items():
+            while True:
+                try:
+                    if jobs.get_nowait() is not None:
+                        with self._cond:
+                            self._pending -= 1
+                except queue.Empty:
+                    break
+            for _ in self.threads[notifier]:
+                jobs.put(None)
+        deadline = time.monotonic() + self.CLOSE_GRACE
+        for notifier in self.notifiers:
+            for thread in self.threads[notifier]:
+                thread.join(max(0.0, deadline - time.monotonic()))
+            if any(thread.is_alive() for thread in self.threads[notifier]):
+                logger.warning(f"[{notifier.name}] 仍有通知在发送，跳过关闭会话")
+                continue
+            notifier.close()
+
+    def metrics(self):
+        return {notifier.name: dict(notifier.stats) for notifier in self.notifiers}
 
 class MultiAccountManager:
     """多账号管理器 - 简化配置版本"""
@@ -1207,7 +4460,22 @@ class MultiAccountManager:
     def __init__(self, auto_load=True):
         self.telegram_bot_token = os.getenv('TELEGRAM_BOT_TOKEN', '')
         self.telegram_chat_id = os.getenv('TELEGRAM_CHAT_ID', '')
+        notifiers = load_notifiers()
+        self.notifications = NotificationQueue(notifiers) if notifiers else None
+        self.stream_updates = _env_bool('LEAFLOW_NOTIFY_STREAM')
+        self.notify_timeout = _env_int('LEAFLOW_NOTIFY_TIMEOUT', 30, minimum=1)
+        self.max_workers = _env_int('LEAFLOW_MAX_WORKERS', 1, minimum=1)
+        self.reuse_driver = _env_bool('LEAFLOW_REUSE_DRIVER')
+        self.browser_contexts = _env_bool('LEAFLOW_BROWSER_CONTEXTS')
+        self.cache_proxy = _env_bool('LEAFLOW_CACHE_PROXY')
+        self.execution_mode = os.getenv('LEAFLOW_EXECUTION_MODE', 'thread').strip().lower() or 'thread'
+        self.driver_pool = None
+        self.ledger = CheckinLedger() if _env_bool('LEAFLOW_LEDGER', True) else None
+        self.checkpoint = RunCheckpoint()
+        self.resume = _env_bool('LEAFLOW_RESUME')
         self.accounts = []
+        self.pending_accounts = []
+        self.skipped_results = {}
         if auto_load:
             self.accounts = self.load_accounts()
     
@@ -1268,84 +4536,274 @@ class MultiAccountManager:
         
         raise ValueError("未找到有效的账号配置")
     
-    def send_notification(self, results):
-        """发送汇总通知到Telegram - 按照指定模板格式"""
-        if not self.telegram_bot_token or not self.telegram_chat_id:
-            logger.info("Telegram配置未设置，跳过通知")
+    @staticmethod
+    def format_account(email, success, result, balance, escape=True):
+        quote = html.escape if escape else str
+        masked_email = _mask_email(email)
+        if success:
+            return f"账号：{masked_email}\n✅ {quote(str(result))}\n💰 当前总余额：{quote(str(balance))}。"
+        return f"账号：{masked_email}\n❌ {quote(str(result))}"
+
+    def format_summary(self, results, interrupted=False, escape=True):
+        """汇总通知 - 按照指定模板格式"""
+        success_count = sum(1 for _, success, _, _ in results if success)
+        total_count = len(results)
+        current_date = datetime.now().strftime("%Y/%m/%d")
+
+        message = f"🎁 Leaflow自动签到通知\n"
+        if interrupted:
+            message += f"⚠️ 任务被中断，仅完成 {total_count}/{len(self.accounts)} 个账号\n"
+        message += f"📊 成功: {success_count}/{total_count}\n"
+        message += f"📅 签到时间：{current_date}\n"
+        if self.ledger:
+            rewards = [entry.get('reward') or 0 for entry in self.ledger.entries_for().values()]
+            if any(rewards):
+                message += f"🎉 今日累计奖励：{sum(rewards):g} 元\n"
+        message += "\n"
+
+        for result in results:
+            message += self.format_account(*result, escape=escape) + "\n\n"
+        return message
+
+    @staticmethod
+    def _result_payload(results):
+        return [
+            {'account': _mask_email(email), 'success': success, 'result': str(result), 'balance': str(balance)}
+            for email, success, result, balance in results
+        ]
+
+    @timed_phase('send_notification')
+    def send_notification(self, results, interrupted=False):
+        """把汇总通知放入后台投递队列，不等待发送完成"""
+        if not self.notifications:
+            logger.info("未配置通知后端，跳过通知")
             return
-        
+        success_count = sum(1 for _, success, _, _ in results if success)
+        self.notifications.publish({
+            'kind': 'summary',
+            'subject': f"Leaflow自动签到通知 {success_count}/{len(results)}",
+            'text': self.format_summary(results, interrupted, escape=False),
+            'html': self.format_summary(results, interrupted),
+            'results': self._result_payload(results),
+        })
+
+    def _publish_account(self, email, success, result, balance):
+        self.notifications.publish({
+            'kind': 'account',
+            'subject': f"Leaflow签到 {_mask_email(email)}",
+            'text': self.format_account(email, success, result, balance, escape=False),
+            'html': self.format_account(email, success, result, balance),
+            'results': self._result_payload([(email, success, result, balance)]),
+        })
+
+    def flush_notifications(self, timeout=None):
+        if not self.notifications:
+            return
+        with RUN_REPORT.phase('notify_flush'):
+            if self.notifications.flush(timeout or self.notify_timeout):
+                logger.info("汇总通知发送成功")
+        RUN_REPORT.extra['notifications'] = self.notifications.metrics()
+
+    def _split_done_accounts(self):
+        """跳过检查点中已确认完成的账号（恢复模式）以及签到台账中今天已签到的账号"""
+        self.skipped_results = {}
         try:
-            success_count = sum(1 for _, success, _, _ in results if success)
-            total_count = len(results)
-            current_date = datetime.now().strftime("%Y/%m/%d")
-            
-            message = f"🎁 Leaflow自动签到通知\n"
-            message += f"📊 成功: {success_count}/{total_count}\n"
-            message += f"📅 签到时间：{current_date}\n\n"
-            
-            for email, success, result, balance in results:
-                masked_email = email[:3] + "***" + email[email.find("@"):]
-                
-                escaped_result = html.escape(str(result))
-                escaped_balance = html.escape(str(balance))
-                
-                if success:
-                    status = "✅"
-                    message += f"账号：{masked_email}\n"
-                    message += f"{status} {escaped_result}\n"
-                    message += f"💰 当前总余额：{escaped_balance}。\n\n"
-                else:
-                    status = "❌"
-                    message += f"账号：{masked_email}\n"
-                    message += f"{status} {escaped_result}\n\n"
-            
-            url = f"https://api.telegram.org/bot{self.telegram_bot_token}/sendMessage"
-            data = {
-                "chat_id": self.telegram_chat_id,
-                "text": message,
-                "parse_mode": "HTML"
-            }
-            
-            response = requests.post(url, data=data, timeout=10)
-            if response.status_code == 200:
-                logger.info("Telegram汇总通知发送成功")
+            restored = self.checkpoint.start(self.accounts, self.resume)
+        except Exception as e:
+            logger.warning(f"初始化检查点失败: {e}")
+            restored = {}
+        done = self.ledger.entries_for() if self.ledger else {}
+        pending = []
+        for account in self.accounts:
+            key = _account_key(account['email'])
+            saved = restored.get(key)
+            entry = done.get(key)
+            if saved and _is_confirmed_result(saved.get('success'), saved.get('result')):
+                logger.info(f"账号 {_mask_email(account['email'])} 已在检查点中完成，跳过")
+                self.skipped_results[account['email']] = (
+                    account['email'], True, saved.get('result'), saved.get('balance') or "未知"
+                )
+            elif entry:
+                logger.info(f"账号 {_mask_email(account['email'])} 今天已于 {entry.get('time')} 签到，跳过")
+                self.skipped_results[account['email']] = (
+                    account['email'], True, CheckinLedger.describe(entry), entry.get('balance') or "未知"
+                )
             else:
-                logger.error(f"Telegram通知发送失败: {response.text}")
-                
+                pending.append(account)
+        return pending
+
+    def checkpoint_results(self):
+        """检查点中本次运行已完成的账号结果（用于中断时发送通知）"""
+        saved = self.checkpoint.results()
+        results = []
+        for account in self.accounts:
+            entry = saved.get(_account_key(account['email']))
+            if entry:
+                results.append((account['email'], entry.get('success'), entry.get('result'), entry.get('balance') or "未知"))
+        return results
+
+    def merge_results(self, results):
+        """合并本次运行结果与台账中已完成的账号，按账号配置顺序返回"""
+        by_email = {result[0]: result for result in results}
+        by_email.update(self.skipped_results)
+        return [by_email[account['email']] for account in self.accounts if account['email'] in by_email]
+
+    def finish_account(self, email, success, result, balance, seconds):
+        """记录单个账号的最终结果：运行报告与签到台账"""
+        RUN_REPORT.set_result(_account_label(email), success, result, seconds)
+        try:
+            self.checkpoint.record(email, success, result, balance)
         except Exception as e:
-            logger.error(f"发送Telegram通知时出错: {e}")
-    
+            logger.warning(f"写入检查点失败: {e}")
+        # 只有确认完成的签到才写入台账，签到失败的账号当天重新运行时会再次处理
+        if _is_confirmed_result(success, result) and self.ledger:
+            try:
+                self.ledger.record(email, result, balance)
+            except Exception as e:
+                logger.warning(f"写入签到台账失败: {e}")
+        if self.stream_updates and self.notifications:
+            # 逐账号推送，最终汇总仍在全部完成后发送
+            self._publish_account(email, success, result, balance)
+
+    def _run_account(self, account):
+        """处理单个账号，异常转换为失败结果，保证不会中断整体流程"""
+        start = time.perf_counter()
+        try:
+            auto_checkin = LeaflowAutoCheckin(account['email'], account['password'], driver_pool=self.driver_pool)
+            success, result, balance = auto_checkin.run()
+        except Exception as e:
+            success, result, balance = False, f"处理账号时发生异常: {str(e)}", "未知"
+            logger.error(result)
+        self.finish_account(account['email'], success, result, balance, time.perf_counter() - start)
+        return (account['email'], success, result, balance)
+
+    def _run_sequential(self):
+        results = []
+        accounts = self.pending_accounts
+        for i, account in enumerate(accounts, 1):
+            logger.info(f"处理第 {i}/{len(accounts)} 个账号")
+            results.append(self._run_account(account))
+
+            if i < len(accounts):
+                wait_time = RATE_LIMITER.account_gap(BASE_URL)
+                logger.info(f"等待{wait_time:.1f}秒后处理下一个账号...")
+                time.sleep(wait_time)
+        return results
+
+    def _run_parallel(self, workers):
+        """使用有界线程池并发处理账号，每个任务持有独立的浏览器实例"""
+        logger.info(f"并发模式：{workers} 个工作线程")
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="account")
+        completed = False
+        try:
+            futures = []
+            accounts = self.pending_accounts
+            for i, account in enumerate(accounts, 1):
+                logger.info(f"提交第 {i}/{len(accounts)} 个账号: {_mask_email(account['email'])}")
+                futures.append(executor.submit(self._run_account, account))
+            # 按账号顺序收集结果，单个账号失败不会影响其它任务
+            results = [future.result() for future in futures]
+            completed = True
+            return results
+        finally:
+            # 被中断时不等待运行中的账号，尽快发送已完成部分的通知
+            executor.shutdown(wait=completed, cancel_futures=True)
+
     def run_all(self):
         """运行所有账号的签到流程"""
         logger.info(f"开始执行 {len(self.accounts)} 个账号的签到任务")
-        
-        results = []
-        
-        for i, account in enumerate(self.accounts, 1):
-            logger.info(f"处理第 {i}/{len(self.accounts)} 个账号")
-            
-            try:
-                auto_checkin = LeaflowAutoCheckin(account['email'], account['password'])
-                success, result, balance = auto_checkin.run()
-                results.append((account['email'], success, result, balance))
-                
-                if i < len(self.accounts):
-                    wait_time = 5
-                    logger.info(f"等待{wait_time}秒后处理下一个账号...")
-                    time.sleep(wait_time)
-                    
-            except Exception as e:
-                error_msg = f"处理账号时发生异常: {str(e)}"
-                logger.error(error_msg)
-                results.append((account['email'], False, error_msg, "未知"))
-        
-        self.send_notification(results)
-        
+
+        self.pending_accounts = self._split_done_accounts()
+        if self.pending_accounts and _env_bool('LEAFLOW_PROBE', True):
+            with RUN_REPORT.phase('probe_endpoints'):
+                ENDPOINTS.probe([f"{BASE_URL}/workspaces"] + load_checkin_urls())
+
+        if self.cache_proxy and self.pending_accounts:
+            CACHE_PROXY.start()
+
+        workers = min(self.max_workers, len(self.pending_accounts))
+        # 多进程模式下浏览器随子进程创建和回收，不使用驱动池
+        if self.pending_accounts and self.execution_mode != 'process':
+            if self.browser_contexts:
+                logger.info(f"启用共享浏览器，{max(1, workers)} 个账号并发使用独立的浏览器上下文")
+                self.driver_pool = BrowserContextPool(max(1, workers))
+            elif self.reuse_driver:
+                logger.info(f"启用浏览器复用，驱动池大小: {max(1, workers)}")
+                self.driver_pool = DriverPool(max(1, workers))
+
+        notified = False
+        try:
+            if not self.pending_accounts:
+                logger.info("所有账号今天均已签到，无需启动浏览器")
+                results = self.merge_results([])
+            elif self.execution_mode == 'process':
+                results = self.merge_results(ProcessWorkerPool(self, max(1, workers)).run())
+            elif self.execution_mode == 'async':
+                logger.info(f"asyncio 调度模式，并发数: {max(1, workers)}")
+                results = asyncio.run(AsyncOrchestrator(self, workers).run())
+                notified = True
+            elif workers > 1:
+                results = self.merge_results(self._run_parallel(workers))
+            else:
+                results = self.merge_results(self._run_sequential())
+            # 通知在后台发送，与关闭浏览器、写报告等收尾工作并行
+            if not notified:
+                self.send_notification(results)
+                notified = True
+        except (KeyboardInterrupt, SystemExit):
+            results = self.merge_results(self.checkpoint_results())
+            logger.error(f"任务被中断，已完成 {len(results)}/{len(self.accounts)} 个账号，可设置 LEAFLOW_RESUME=true 继续")
+            self.send_notification(results, interrupted=True)
+            # 被终止前只剩几秒，尽量发出通知
+            self.flush_notifications(timeout=5)
+            ARTIFACTS.flush(timeout=2)
+            RUN_REPORT.write()
+            raise
+        finally:
+            if self.driver_pool:
+                if isinstance(self.driver_pool, BrowserContextPool):
+                    RUN_REPORT.extra['browser_contexts'] = self.driver_pool.summary()
+                self.driver_pool.close()
+                self.driver_pool = None
+            CACHE_PROXY.stop()
+
+        block_summary = BLOCK_STATS.summary()
+        if block_summary['blocked_requests']:
+            logger.info(
+                f"资源拦截统计: 共拦截 {block_summary['blocked_requests']} 个请求，"
+                f"估算节省 {block_summary['estimated_bytes_saved'] / 1024:.0f} KB（按类型平均大小估算，非实测），"
+                f"按类型请求数: {block_summary['by_type']}"
+            )
+
+        try:
+            self.checkpoint.complete()
+        except Exception as e:
+            logger.warning(f"更新检查点失败: {e}")
+
+        self.flush_notifications()
+        RUN_REPORT.extra['artifacts'] = ARTIFACTS.flush()
+        RUN_REPORT.extra['network_blocking'] = block_summary
+        RUN_REPORT.extra['rate_limits'] = RATE_LIMITER.summary()
+        RUN_REPORT.extra['locators'] = LOCATORS.summary()
+        if CACHE_PROXY.address:
+            proxy_summary = CACHE_PROXY.summary()
+            logger.info(
+                f"缓存代理: 静态资源命中 {proxy_summary['hits']}/{proxy_summary['asset_requests']}，"
+                f"节省 {proxy_summary['bytes_saved'] / 1024:.0f} KB 下载"
+            )
+            RUN_REPORT.extra['proxy'] = proxy_summary
+        RUN_REPORT.write()
+
         success_count = sum(1 for _, success, _, _ in results if success)
         return success_count == len(self.accounts), results
 
+def _handle_sigterm(signum, frame):
+    # 作业超时或被取消时 Actions 发送 SIGTERM，转为 KeyboardInterrupt 以便发送已完成部分的通知
+    raise KeyboardInterrupt(f"signal {signum}")
+
 def main():
     """主函数"""
+    signal.signal(signal.SIGTERM, _handle_sigterm)
     try:
         manager = MultiAccountManager()
         overall_success, detailed_results = manager.run_all()
@@ -1358,6 +4816,9 @@ def main():
             logger.warning(f"⚠️ 部分账号签到失败: {success_count}/{len(detailed_results)} 成功")
             exit(0)
             
+    except KeyboardInterrupt:
+        logger.error("❌ 脚本被中断，已完成账号的结果已写入检查点")
+        exit(130)
     except Exception as e:
         logger.error(f"❌ 脚本执行出错: {e}")
         exit(1)
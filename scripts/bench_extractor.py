@@ -0,0 +1,94 @@
+"""Check and time CheckinResultExtractor against the captured page samples.
+
+Every sample in result_samples/samples.json is either a browser snapshot
+(toast messages, body text, check-in button state) or a saved HTML page.
+Each one is parsed offline, compared with its expected fields, and then
+parsed repeatedly to measure per-sample cost. No browser or network is used.
+
+Example:
+    python scripts/bench_extractor.py --iterations 20000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLES = Path(__file__).resolve().parent / "result_samples"
+
+
+def load_samples(path):
+    samples = json.loads(path.read_text(encoding="utf-8"))
+    for sample in samples:
+        if sample.get("html"):
+            sample["html_text"] = (path.parent / sample["html"]).read_text(encoding="utf-8")
+    return samples
+
+
+def make_parser(extractor, sample):
+    today = sample.get("today")
+    if "html_text" in sample:
+        page_html = sample["html_text"]
+        return lambda: extractor.extract_html(page_html, today=today)
+    messages = sample.get("messages") or []
+    body_text = sample.get("body_text") or ""
+    button = sample.get("button")
+    return lambda: extractor.extract(messages, body_text, button, today=today)
+
+
+def check(result, expected):
+    """Returns a list of "field: got != expected" strings."""
+    actual = result.to_dict()
+    return [f"{key}: {actual.get(key)!r} != {value!r}"
+            for key, value in expected.items() if actual.get(key) != value]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", default=str(SAMPLES / "samples.json"), help="sample manifest")
+    parser.add_argument("--iterations", type=int, default=5000, help="parses per sample")
+    parser.add_argument("--check-only", action="store_true", help="only verify expectations")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    sys.path.insert(0, str(ROOT))
+    from leaflow_checkin import CheckinResultExtractor
+
+    samples = load_samples(Path(args.samples))
+    failures = 0
+    rows = []
+    for sample in samples:
+        parse = make_parser(CheckinResultExtractor, sample)
+        result = parse()
+        problems = check(result, sample.get("expected") or {})
+        if problems:
+            failures += 1
+            print(f"FAIL {sample['name']}: " + "; ".join(problems))
+
+        if args.check_only:
+            continue
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            parse()
+        elapsed = time.perf_counter() - start
+        rows.append((sample["name"], result, elapsed / max(1, args.iterations)))
+
+    print(f"{len(samples) - failures}/{len(samples)} samples match expectations")
+    if rows:
+        print()
+        print(f"{'sample':<40}{'status':>9}{'reward':>8}{'conf':>6}{'us/parse':>10}")
+        for name, result, per_call in rows:
+            reward = "-" if result.reward is None else f"{result.reward:g}"
+            print(f"{name:<40}{result.status:>9}{reward:>8}{result.confidence:>6.2f}{per_call * 1e6:>10.1f}")
+        total = sum(per_call for _, _, per_call in rows)
+        print()
+        print(f"mean: {total / len(rows) * 1e6:.1f} us per parse ({args.iterations} iterations per sample)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
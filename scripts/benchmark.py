@@ -0,0 +1,277 @@
+"""Offline benchmark for leaflow_checkin against a local mock Leaflow site.
+
+Serves HTML fixtures for /login, /dashboard, /workspaces (check-in modal,
+optionally inside an iframe) and /checkin, then runs MultiAccountManager in
+headless Chrome and prints per-phase and end-to-end timings.
+
+Example:
+    python scripts/benchmark.py --accounts 4 --workers 2 --latency 0.3
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "bench_fixtures"
+SESSION_COOKIE = "bench_session"
+
+
+def load_fixture(name):
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+def render(template, **values):
+    for key, value in values.items():
+        template = template.replace("{{" + key + "}}", str(value))
+    return template
+
+
+class MockSite:
+    """In-memory state of the mock site: balance and check-in status per account."""
+
+    def __init__(self, latency=0.0, iframe=False, bundle_kb=0, modal_delay_ms=300,
+                 start_balance=10.0, reward=0.5):
+        self.latency = latency
+        self.iframe = iframe
+        self.bundle_kb = bundle_kb
+        self.modal_delay_ms = modal_delay_ms
+        self.start_balance = start_balance
+        self.reward = reward
+        self.lock = threading.Lock()
+        self.balances = {}
+        self.checked_in = set()
+        self.requests = 0
+
+    def balance(self, email):
+        with self.lock:
+            return self.balances.setdefault(email, self.start_balance)
+
+    def checkin(self, email):
+        """Returns (already, reward)."""
+        with self.lock:
+            self.balances.setdefault(email, self.start_balance)
+            if email in self.checked_in:
+                return True, 0
+            self.checked_in.add(email)
+            self.balances[email] = round(self.balances[email] + self.reward, 2)
+            return False, self.reward
+
+    def bundle_tag(self):
+        return '<script src="/static/app.js"></script>' if self.bundle_kb else ""
+
+    def widget(self, email):
+        if email in self.checked_in:
+            state = '<p>今日已签到</p><button class="checkin-btn" type="button" disabled>已签到</button>'
+        else:
+            state = '<button id="checkin-now" class="checkin-btn" type="button">立即签到</button>'
+        return render(load_fixture("checkin_widget.html"), state=state)
+
+
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _email(self):
+            cookie = SimpleCookie(self.headers.get("Cookie", ""))
+            morsel = cookie.get(SESSION_COOKIE)
+            return unquote(morsel.value) if morsel else None
+
+        def _delay(self):
+            with site.lock:
+                site.requests += 1
+            if site.latency:
+                time.sleep(site.latency)
+
+        def _send(self, body, status=200, content_type="text/html; charset=utf-8", headers=None):
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _redirect(self, location, headers=None):
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.send_header("Content-Length", "0")
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+
+        def _require_login(self):
+            email = self._email()
+            if not email:
+                self._redirect("/login")
+            return email
+
+        def do_GET(self):
+            self._delay()
+            path = urlparse(self.path).path
+            bundle = site.bundle_tag()
+
+            if path == "/static/app.js":
+                body = "/* bench bundle */\n" + ("// " + "x" * 1021 + "\n") * site.bundle_kb
+                return self._send(body, content_type="application/javascript",
+                                  headers={"Cache-Control": "public, max-age=31536000, immutable"})
+            if path in ("/", "/login"):
+                if path == "/" and self._email():
+                    return self._redirect("/dashboard")
+                return self._send(render(load_fixture("login.html"), bundle=bundle))
+
+            email = self._require_login()
+            if not email:
+                return
+            if path == "/dashboard":
+                return self._send(render(load_fixture("dashboard.html"), bundle=bundle,
+                                         balance=f"{site.balance(email):.2f}"))
+            if path == "/workspaces":
+                modal = '<iframe src="/checkin/frame"></iframe>' if site.iframe else site.widget(email)
+                return self._send(render(load_fixture("workspaces.html"), bundle=bundle, modal=modal,
+                                         modal_delay_ms=site.modal_delay_ms))
+            if path == "/checkin/frame":
+                return self._send(render(load_fixture("checkin_frame.html"), widget=site.widget(email)))
+            if path == "/checkin":
+                if email in site.checked_in:
+                    body = '<p>今日已签到</p><button class="checkin-btn" disabled>已签到</button>'
+                else:
+                    body = ('<form method="post" action="/checkin">'
+                            '<input type="hidden" name="_token" value="bench-token">'
+                            '<button type="submit" class="checkin-btn">立即签到</button></form>')
+                return self._send(render(load_fixture("checkin.html"), bundle=bundle, body=body))
+            self._send("not found", status=404, content_type="text/plain")
+
+        def do_POST(self):
+            self._delay()
+            path = urlparse(self.path).path
+            length = int(self.headers.get("Content-Length") or 0)
+            form = parse_qs(self.rfile.read(length).decode("utf-8")) if length else {}
+
+            if path == "/login":
+                email = (form.get("email") or [""])[0]
+                if not email or not (form.get("password") or [""])[0]:
+                    return self._redirect("/login")
+                return self._redirect("/dashboard", headers={
+                    "Set-Cookie": f"{SESSION_COOKIE}={quote(email, safe='')}; Path=/; HttpOnly"
+                })
+
+            email = self._require_login()
+            if not email:
+                return
+            if path == "/api/checkin":
+                already, reward = site.checkin(email)
+                return self._send(json.dumps({"already": already, "reward": reward,
+                                              "balance": site.balance(email)}),
+                                  content_type="application/json")
+            if path == "/checkin":
+                already, reward = site.checkin(email)
+                message = "今日已签到" if already else f"签到成功，获得 {reward} 元"
+                body = f'<div class="alert-success">{message}</div>'
+                return self._send(render(load_fixture("checkin.html"), bundle=site.bundle_tag(), body=body))
+            self._send("not found", status=404, content_type="text/plain")
+
+    return Handler
+
+
+def start_server(site, port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(site))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=2, help="number of mock accounts")
+    parser.add_argument("--workers", type=int, default=1, help="LEAFLOW_MAX_WORKERS")
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial latency per request (seconds)")
+    parser.add_argument("--iframe", action="store_true", help="render the check-in modal inside an iframe")
+    parser.add_argument("--bundle-kb", type=int, default=0, help="size of a static JS bundle on every page")
+    parser.add_argument("--modal-delay-ms", type=int, default=300, help="delay before the modal opens")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--serve", action="store_true", help="only serve the mock site until interrupted")
+    parser.add_argument("--report", default="", help="where to write the JSON run report")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for leaflow_checkin (repeatable)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    site = MockSite(latency=args.latency, iframe=args.iframe, bundle_kb=args.bundle_kb,
+                    modal_delay_ms=args.modal_delay_ms)
+    server = start_server(site, args.port)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    print(f"Mock Leaflow site: {base_url}")
+
+    if args.serve:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            return
+
+    workdir = tempfile.mkdtemp(prefix="leaflow-bench-")
+    report_path = args.report or os.path.join(workdir, "leaflow_report.json")
+    accounts = ",".join(f"bench{i}@example.com:pass{i}" for i in range(1, args.accounts + 1))
+    env = {
+        "LEAFLOW_BASE_URL": base_url,
+        "LEAFLOW_CHECKIN_URLS": f"{base_url}/checkin",
+        "LEAFLOW_ACCOUNTS": accounts,
+        "LEAFLOW_MAX_WORKERS": str(args.workers),
+        "LEAFLOW_STATE_DIR": os.path.join(workdir, "state"),
+        "LEAFLOW_REPORT_PATH": report_path,
+        "TELEGRAM_BOT_TOKEN": "",
+        "TELEGRAM_CHAT_ID": "",
+    }
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    os.environ.update(env)
+    for key in ("LEAFLOW_COOKIE", "LEAFLOW_EMAIL", "LEAFLOW_PASSWORD", "LEAFLOW_CHECKIN_URL"):
+        os.environ.pop(key, None)
+
+    # leaflow_checkin reads LEAFLOW_BASE_URL at import time
+    sys.path.insert(0, str(ROOT))
+    os.chdir(workdir)
+    import leaflow_checkin
+
+    start = time.perf_counter()
+    overall_success, results = leaflow_checkin.MultiAccountManager().run_all()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    report = json.loads(Path(report_path).read_text(encoding="utf-8"))
+    print()
+    print(f"accounts={args.accounts} workers={args.workers} latency={args.latency}s "
+          f"iframe={args.iframe} requests={site.requests}")
+    print(f"end-to-end: {elapsed:.2f}s  ({elapsed / max(1, args.accounts):.2f}s per account)")
+    print(f"success: {sum(1 for r in results if r[1])}/{len(results)}")
+    print()
+    print(f"{'phase':<32}{'count':>6}{'total s':>10}{'avg s':>9}{'max s':>9}{'fail':>6}")
+    for phase, total in sorted(report["phase_totals"].items(), key=lambda kv: -kv[1]["total_seconds"]):
+        print(f"{phase:<32}{total['count']:>6}{total['total_seconds']:>10.2f}"
+              f"{total['avg_seconds']:>9.2f}{total['max_seconds']:>9.2f}{total['failures']:>6}")
+    proxy = report.get("proxy")
+    if proxy:
+        print()
+        print(f"proxy: hits {proxy['hits']}/{proxy['asset_requests']} asset requests, "
+              f"{proxy['bytes_saved'] / 1024:.0f} KB served from cache, {proxy['bytes_fetched'] / 1024:.0f} KB fetched")
+    print()
+    print(f"report: {report_path}")
+    return 0 if overall_success else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())